@@ -1,16 +1,129 @@
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
     QLineEdit, QCheckBox, QPushButton, QMessageBox, QTabWidget,
-    QListWidget, QInputDialog, QGroupBox
+    QListView, QInputDialog, QGroupBox, QSpinBox, QComboBox, QLabel
 )
-from PyQt5.QtCore import Qt
-from book_library import Book, EBook, Library, BookNotAvailableError
+from PyQt5.QtCore import (
+    Qt, QAbstractListModel, QModelIndex, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+)
+from book_library import Book, EBook, Library, BookNotAvailableError, InvalidISBNError, normalize_isbn
+from catalog_storage import WalStorage
+from library_server import RemoteLibrary
+from sqlite_library import SqliteLibrary
 import sys
 
+# Catalog is kept on disk here between runs
+DATA_DIR = "library_data"
+
+# Most results the search box shows
+SEARCH_LIMIT = 200
+
+# Typing pause (ms) before the search box runs its query
+SEARCH_DELAY = 250
+
+# Orders the book lists can be sorted in: label -> Library.sorted_view
+# order, None for the order the books were added in
+SORT_ORDERS = {"Added": None, "Title": "title", "Author": "author", "ISBN": "isbn"}
+
+# A .db/.sqlite path on the command line opens that SQLite catalog instead,
+# an http:// URL the shared catalog of a library_server.py
+def open_library(argv):
+    if len(argv) > 1 and argv[1].startswith("http://"):
+        return RemoteLibrary(argv[1])
+    if len(argv) > 1 and argv[1].endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteLibrary(argv[1])
+    return Library(storage=WalStorage(DATA_DIR, durability="op"))
+
+# List model over any sequence of books (e.g. Library.available_view()).
+# Rows are only formatted when the view asks for them, so a refresh costs
+# the same no matter how many books there are.
+class BookListModel(QAbstractListModel):
+    def __init__(self, books=()):
+        super().__init__()
+        self.books = books
+        self.rows = len(books)  # row count the view currently knows about
+
+    def set_books(self, books):
+        self.beginResetModel()
+        self.books = books
+        self.rows = len(books)
+        self.endResetModel()
+
+    # Catch up with a live view after a change: new books sit at the end,
+    # removed ones are filled by moving the last books into their rows.
+    # Only the rows past the end are inserted/removed; as rows may have
+    # moved or changed their copy counts, dataChanged makes the view
+    # repaint the part it shows.
+    def sync(self):
+        count = len(self.books)
+        if count > self.rows:
+            self.beginInsertRows(QModelIndex(), self.rows, count - 1)
+            self.rows = count
+            self.endInsertRows()
+        elif count < self.rows:
+            self.beginRemoveRows(QModelIndex(), count, self.rows - 1)
+            self.rows = count
+            self.endRemoveRows()
+        if count:
+            self.dataChanged.emit(self.index(0), self.index(count - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        # The live view may already be shorter than self.rows until sync() runs
+        if role == Qt.DisplayRole and index.isValid() and index.row() < len(self.books):
+            return str(self.books[index.row()])
+        return None
+
+# Signals of a SearchTask. It lives on the GUI thread, so results emitted
+# from the worker are delivered there through the event loop.
+class SearchSignals(QObject):
+    finished = pyqtSignal(int, str, list)  # generation, query, books
+    failed = pyqtSignal(int, str, str)  # generation, query, error message
+
+# One search query, run on a QThreadPool worker
+class SearchTask(QRunnable):
+    def __init__(self, library, query, generation, signals):
+        super().__init__()
+        self.library = library
+        self.query = query
+        self.generation = generation
+        self.signals = signals
+
+    # An exception escaping run() would abort the whole app, so a failed
+    # search (the index build failed, the library server is down) is
+    # reported as a signal instead
+    def run(self):
+        try:
+            books = self.library.search(self.query, limit=SEARCH_LIMIT)
+        except Exception as error:
+            self.signals.failed.emit(self.generation, self.query, str(error) or type(error).__name__)
+            return
+        self.signals.finished.emit(self.generation, self.query, books)
+
+def make_book_view(model):
+    view = QListView()
+    view.setModel(model)
+    view.setUniformItemSizes(True)  # lets the view skip measuring every row
+    return view
+
 class LibraryApp(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.library = Library()
+        self.library = open_library(sys.argv)
+        self.library.subscribe(self.on_library_changed)
+        if isinstance(self.library, Library):
+            self.library.build_search_index()  # in the background, ready for the first search
+        self.showing_search = False
+        # Live search: queries run one at a time on a worker thread, and each
+        # gets a generation number so results of superseded ones are dropped
+        self.search_pool = QThreadPool()
+        self.search_pool.setMaxThreadCount(1)
+        self.search_generation = 0
+        self.search_signals = SearchSignals()
+        self.search_signals.finished.connect(self.on_search_finished)
+        self.search_signals.failed.connect(self.on_search_failed)
         self.setWindowTitle("Library Management System")
         self.setGeometry(100, 100, 700, 550)
 
@@ -34,12 +147,15 @@ class LibraryApp(QMainWindow):
         self.ebook_check.stateChanged.connect(self.toggle_size_field)
         self.size_input = QLineEdit()
         self.size_input.setDisabled(True)
+        self.copies_input = QSpinBox()
+        self.copies_input.setRange(1, 9999)
 
         self.form_layout.addRow("Title:", self.title_input)
         self.form_layout.addRow("Author:", self.author_input)
         self.form_layout.addRow("ISBN:", self.isbn_input)
         self.form_layout.addRow(self.ebook_check)
         self.form_layout.addRow("Download Size (MB):", self.size_input)
+        self.form_layout.addRow("Copies:", self.copies_input)
 
         self.layout.addWidget(self.form_group)
 
@@ -62,16 +178,48 @@ class LibraryApp(QMainWindow):
 
         self.layout.addLayout(self.button_layout)
 
+        # Title/author search row
+        self.search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search title or author")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.search_books)
+        # Each keystroke restarts the timer, so a query runs once typing pauses
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_input.returnPressed.connect(self.search_books)
+        self.search_go_btn = QPushButton("Search")
+        self.search_go_btn.clicked.connect(self.search_books)
+        self.sort_box = QComboBox()
+        self.sort_box.addItems(SORT_ORDERS)
+        self.sort_box.currentTextChanged.connect(self.update_book_list)
+        self.search_layout.addWidget(self.search_input)
+        self.search_layout.addWidget(self.search_go_btn)
+        self.search_layout.addWidget(QLabel("Sort by:"))
+        self.search_layout.addWidget(self.sort_box)
+        self.layout.addLayout(self.search_layout)
+
         # Tabs
         self.tabs = QTabWidget()
-        self.available_list = QListWidget()
-        self.lent_list = QListWidget()
+        self.available_model = BookListModel()
+        self.lent_model = BookListModel()
+        self.available_list = make_book_view(self.available_model)
+        self.lent_list = make_book_view(self.lent_model)
         self.tabs.addTab(self.available_list, "Available Books")
         self.tabs.addTab(self.lent_list, "Lent Books")
         self.layout.addWidget(self.tabs)
 
         self.update_book_list()
 
+    def closeEvent(self, event):
+        self.search_timer.stop()
+        self.search_generation += 1
+        self.search_pool.clear()
+        self.search_pool.waitForDone()
+        self.library.close()
+        super().closeEvent(event)
+
     def toggle_size_field(self):
         self.size_input.setDisabled(not self.ebook_check.isChecked())
         if not self.ebook_check.isChecked():
@@ -83,15 +231,26 @@ class LibraryApp(QMainWindow):
         self.isbn_input.clear()
         self.ebook_check.setChecked(False)
         self.size_input.clear()
+        self.copies_input.setValue(1)
 
     def update_book_list(self):
-        self.available_list.clear()
-        self.lent_list.clear()
-        for book in self.library.books:
-            if book.is_lent:
-                self.lent_list.addItem(str(book))
-            else:
-                self.available_list.addItem(str(book))
+        self.showing_search = False
+        order = SORT_ORDERS[self.sort_box.currentText()]
+        if order is None:
+            self.available_model.set_books(self.library.available_view())
+            self.lent_model.set_books(self.library.lent_view())
+        else:
+            # The library keeps these sorted, so nothing is sorted here
+            self.available_model.set_books(self.library.sorted_view(order, "available"))
+            self.lent_model.set_books(self.library.sorted_view(order, "lent"))
+
+    # Library observer: update just the rows the change touched
+    def on_library_changed(self, event, books):
+        if self.showing_search:
+            self.update_book_list()
+            return
+        self.available_model.sync()
+        self.lent_model.sync()
 
     def add_book(self):
         title = self.title_input.text().strip()
@@ -99,6 +258,7 @@ class LibraryApp(QMainWindow):
         isbn = self.isbn_input.text().strip()
         is_ebook = self.ebook_check.isChecked()
         size = self.size_input.text().strip()
+        copies = self.copies_input.value()
 
         if not title or not author or not isbn:
             QMessageBox.warning(self, "Error", "Title, Author, and ISBN are required.")
@@ -111,59 +271,89 @@ class LibraryApp(QMainWindow):
             if not size.isdigit():
                 QMessageBox.warning(self, "Error", "Download size must be a number.")
                 return
-            book = EBook(title, author, isbn, size)
+
+        try:
+            isbn = normalize_isbn(isbn)
+        except InvalidISBNError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+
+        if is_ebook:
+            book = EBook(title, author, isbn, size, copies)
         else:
-            book = Book(title, author, isbn)
+            book = Book(title, author, isbn, copies)
 
         self.library.add_book(book)
         QMessageBox.information(self, "Success", f"Book '{title}' added.")
-        self.update_book_list()
         self.clear_inputs()
 
     def lend_book(self):
         isbn, ok = QInputDialog.getText(self, "Lend Book", "Enter ISBN to lend:")
         if ok and isbn:
             try:
-                self.library.lend_book(isbn.strip())
+                self.library.lend_book(isbn)
                 QMessageBox.information(self, "Success", "Book lent successfully.")
-                self.update_book_list()
-            except BookNotAvailableError as e:
+            except (BookNotAvailableError, InvalidISBNError) as e:
                 QMessageBox.warning(self, "Error", str(e))
 
     def return_book(self):
         isbn, ok = QInputDialog.getText(self, "Return Book", "Enter ISBN to return:")
         if ok and isbn:
             try:
-                self.library.return_book(isbn.strip())
+                self.library.return_book(isbn)
                 QMessageBox.information(self, "Success", "Book returned successfully.")
-                self.update_book_list()
-            except BookNotAvailableError as e:
+            except (BookNotAvailableError, InvalidISBNError) as e:
                 QMessageBox.warning(self, "Error", str(e))
 
     def remove_book(self):
         isbn, ok = QInputDialog.getText(self, "Remove Book", "Enter ISBN to remove:")
         if ok and isbn:
-            self.library.remove_book(isbn.strip())
-            QMessageBox.information(self, "Success", "Book removed.")
-            self.update_book_list()
+            try:
+                self.library.remove_book(isbn)
+                QMessageBox.information(self, "Success", "Book removed.")
+            except InvalidISBNError as e:
+                QMessageBox.warning(self, "Error", str(e))
 
     def view_books_by_author(self):
         author, ok = QInputDialog.getText(self, "Search by Author", "Enter author's name:")
         if ok and author:
             books = list(self.library.books_by_author(author.strip()))
-            self.available_list.clear()
-            self.lent_list.clear()
-
-            if books:
-                self.available_list.addItem(f"Books by {author}:")
-                for book in books:
-                    if book.is_lent:
-                        self.lent_list.addItem(str(book))
-                    else:
-                        self.available_list.addItem(str(book))
-            else:
+            self.show_results(f"Books by {author}:" if books else None, books)
+
+            if not books:
                 QMessageBox.information(self, "Not Found", "No books found by this author.")
 
+    def search_books(self):
+        self.search_timer.stop()
+        query = self.search_input.text().strip()
+        # A newer query makes every earlier one stale: queued ones are
+        # dropped here, one already running is ignored when it finishes
+        self.search_generation += 1
+        self.search_pool.clear()
+        if not query:
+            self.update_book_list()
+            return
+        self.search_pool.start(SearchTask(self.library, query, self.search_generation, self.search_signals))
+
+    def on_search_finished(self, generation, query, books):
+        if generation != self.search_generation:
+            return
+        self.show_results(f"Results for '{query}':" if books else f"No results for '{query}'", books)
+
+    # Shown in place of the results rather than in a dialog, since a search
+    # runs on every pause in typing
+    def on_search_failed(self, generation, query, message):
+        if generation != self.search_generation:
+            return
+        self.show_results(f"Search for '{query}' failed: {message}", [])
+
+    # Show a result list in the tabs until the next library change
+    def show_results(self, header, books):
+        available = [book for book in books if book.available_copies]
+        self.available_model.set_books(([header] if header else []) + available)
+        self.lent_model.set_books([book for book in books if book.lent_copies])
+        self.showing_search = True
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = LibraryApp()
@@ -0,0 +1,127 @@
+# async_library.py
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+
+# Books handed to the event loop per round trip by the async iterators
+CHUNK_SIZE = 1000
+
+# asyncio facade over a Library or SqliteLibrary. Every call runs on an
+# executor thread, so scans and storage I/O never block the event loop. By
+# default the facade owns a single worker thread, which also keeps backends
+# that want one thread at a time (SQLite connections) happy; pass a wider
+# executor to run calls on a thread-safe Library side by side.
+#
+#     async with AsyncLibrary(Library(storage=WalStorage("data"))) as library:
+#         await library.lend_book(isbn)
+#         async for book in library.books_by_author("Tolkien"):
+#             ...
+class AsyncLibrary:
+    def __init__(self, library, executor=None):
+        self.library = library
+        self._owns_executor = executor is None
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def add_book(self, book, duplicates=None):
+        return await self._run(self.library.add_book, book, duplicates)
+
+    async def bulk_load(self, books, duplicates=None):
+        return await self._run(self.library.bulk_load, books, duplicates)
+
+    async def upsert_book(self, book):
+        return await self._run(self.library.upsert_book, book)
+
+    async def upsert_many(self, books):
+        return await self._run(self.library.upsert_many, books)
+
+    async def remove_book(self, isbn):
+        return await self._run(self.library.remove_book, isbn)
+
+    async def remove_many(self, isbns):
+        return await self._run(self.library.remove_many, list(isbns))
+
+    async def find_books(self, isbn):
+        return await self._run(self.library.find_books, isbn)
+
+    async def lend_book(self, isbn):
+        return await self._run(self.library.lend_book, isbn)
+
+    async def return_book(self, isbn):
+        return await self._run(self.library.return_book, isbn)
+
+    async def lend_many(self, isbns):
+        return await self._run(self.library.lend_many, list(isbns))
+
+    async def return_many(self, isbns):
+        return await self._run(self.library.return_many, list(isbns))
+
+    async def search(self, query, limit=20, offset=0):
+        return await self._run(self.library.search, query, limit, offset)
+
+    async def query(self, filter=None, order_by="title", limit=50, cursor=None, start=None, stop=None):
+        return await self._run(self.library.query, filter, order_by, limit, cursor, start, stop)
+
+    async def count(self):
+        return await self._run(len, self.library)
+
+    async def available_count(self):
+        return await self._run(self.library.available_count)
+
+    async def lent_count(self):
+        return await self._run(self.library.lent_count)
+
+    # Async iterators: the wrapped iterator is created and advanced on the
+    # executor, chunk_size books at a time
+    def __aiter__(self):
+        # Available books, like iterating a Library
+        return self._iterate(iter, self.library)
+
+    def lent_books(self, chunk_size=CHUNK_SIZE):
+        return self._iterate(self.library.lent_books, chunk_size=chunk_size)
+
+    def books_by_author(self, author, chunk_size=CHUNK_SIZE):
+        return self._iterate(self.library.books_by_author, author, chunk_size=chunk_size)
+
+    def stream(self, status=None, chunk_size=CHUNK_SIZE):
+        return self._iterate(self.library.stream, status, chunk_size, chunk_size=chunk_size)
+
+    async def _iterate(self, make_iterator, *args, chunk_size=CHUNK_SIZE):
+        books = await self._run(make_iterator, *args)
+        while True:
+            chunk = await self._run(lambda: list(itertools.islice(books, chunk_size)))
+            if not chunk:
+                return
+            for book in chunk:
+                yield book
+
+    # Register callback(event, books) to be called on the event loop after
+    # each change, whichever thread made it
+    def subscribe(self, callback):
+        loop = asyncio.get_running_loop()
+
+        def forward(event, books):
+            loop.call_soon_threadsafe(callback, event, books)
+
+        self.library.subscribe(forward)
+        return forward  # pass to library.unsubscribe() to stop
+
+    async def flush(self):
+        return await self._run(self.library.flush)
+
+    async def close(self):
+        try:
+            await self._run(self.library.close)
+        finally:
+            if self._owns_executor:
+                self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,207 @@
+# catalog_io.py
+import contextlib
+import csv
+import json
+import itertools
+import os
+import struct
+
+from book_library import Book, EBook, book_from_dict, book_to_dict
+
+# Catalog import. Readers stream one row at a time and yield Book/EBook
+# objects, so parsing memory stays bounded whatever the file size; the
+# import_* helpers feed them straight into library.bulk_load(), passing on
+# its duplicates policy ("replace" makes re-running the same feed a no-op).
+#
+# CSV files need a header with title, author and isbn columns, plus optional
+# download_size (non-empty makes an EBook), copies and lent_copies columns;
+# files with an is_lent column instead, from before holdings, still load.
+# JSON Lines files hold one object per line in the book_to_dict() format.
+
+TRUE_VALUES = ("1", "true", "yes", "y")
+
+CSV_FIELDS = ("title", "author", "isbn", "download_size", "copies", "lent_copies")
+
+# Compact binary format: the magic header, then one record per book made of
+# a flags byte (FLAG_EBOOK), the title, author and isbn as
+# varint-length-prefixed UTF-8, the copies and lent copies as varints, and
+# for eBooks the download size as a little-endian float64. Version 1 files
+# had no copy counts and a FLAG_LENT bit instead; they are still read.
+BINARY_MAGIC = b"BKLIB\x02"
+BINARY_MAGIC_V1 = b"BKLIB\x01"
+FLAG_LENT = 1
+FLAG_EBOOK = 2
+_SIZE = struct.Struct("<d")
+
+# Books written per chunk by the exporters
+CHUNK_SIZE = 1000
+
+
+@contextlib.contextmanager
+def _open(source, mode, **kwargs):
+    # Paths are opened (and closed) here; file-like objects are used as given
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, mode, **kwargs) as f:
+            yield f
+    else:
+        yield source
+
+
+def read_csv(source):
+    with _open(source, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            size = row.get("download_size")
+            copies = int(row.get("copies") or 1)
+            if size:
+                book = EBook(row["title"], row["author"], row["isbn"], _number(size), copies)
+            else:
+                book = Book(row["title"], row["author"], row["isbn"], copies)
+            if row.get("lent_copies"):
+                book.lent_copies = int(row["lent_copies"])
+            else:
+                book.is_lent = (row.get("is_lent") or "").strip().lower() in TRUE_VALUES
+            yield book
+
+
+def read_jsonl(source):
+    with _open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield book_from_dict(json.loads(line))
+
+
+def import_csv(library, source, duplicates=None):
+    return library.bulk_load(read_csv(source), duplicates)
+
+
+def import_jsonl(library, source, duplicates=None):
+    return library.bulk_load(read_jsonl(source), duplicates)
+
+
+def read_binary(source):
+    with _open(source, "rb") as f:
+        magic = f.read(len(BINARY_MAGIC))
+        if magic not in (BINARY_MAGIC, BINARY_MAGIC_V1):
+            raise ValueError("Not a binary catalog file")
+        holdings = magic == BINARY_MAGIC
+        while True:
+            flags = f.read(1)
+            if not flags:
+                return
+            flags = flags[0]
+            title, author, isbn = _read_text(f), _read_text(f), _read_text(f)
+            copies, lent_copies = (_read_varint(f), _read_varint(f)) if holdings else (1, flags & FLAG_LENT)
+            if flags & FLAG_EBOOK:
+                size = _SIZE.unpack(f.read(_SIZE.size))[0]
+                book = EBook(title, author, isbn, int(size) if size.is_integer() else size, copies)
+            else:
+                book = Book(title, author, isbn, copies)
+            book.lent_copies = lent_copies
+            yield book
+
+
+def import_binary(library, source, duplicates=None):
+    return library.bulk_load(read_binary(source), duplicates)
+
+
+# Catalog export. Books are pulled from library.stream() (or the author
+# index) and written chunk by chunk, so the full catalog is never copied
+# into a list. status is None for every book, "available" (a copy on the
+# shelf) or "lent" (a copy out); author limits the export to one author.
+# Each exporter returns the number written.
+
+def select_books(library, status=None, author=None):
+    if author is None:
+        return library.stream(status)
+    books = library.books_by_author(author)
+    if status is None:
+        return books
+    if status == "lent":
+        return (book for book in books if book.lent_copies)
+    return (book for book in books if book.available_copies)
+
+
+def export_csv(library, dest, status=None, author=None):
+    with _open(dest, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        return _write_chunks(select_books(library, status, author), lambda chunk: writer.writerows(
+            (book.title, book.author, book.isbn, book.download_size if isinstance(book, EBook) else "",
+             book.copies, book.lent_copies) for book in chunk
+        ))
+
+
+def export_jsonl(library, dest, status=None, author=None):
+    with _open(dest, "w", encoding="utf-8") as f:
+        return _write_chunks(select_books(library, status, author), lambda chunk: f.writelines(
+            json.dumps(book_to_dict(book)) + "\n" for book in chunk
+        ))
+
+
+def export_binary(library, dest, status=None, author=None):
+    with _open(dest, "wb") as f:
+        f.write(BINARY_MAGIC)
+        return _write_chunks(select_books(library, status, author), lambda chunk: f.write(
+            b"".join(_binary_record(book) for book in chunk)
+        ))
+
+
+def _write_chunks(books, write):
+    written = 0
+    books = iter(books)
+    while True:
+        chunk = list(itertools.islice(books, CHUNK_SIZE))
+        if not chunk:
+            return written
+        write(chunk)
+        written += len(chunk)
+
+
+def _binary_record(book):
+    is_ebook = isinstance(book, EBook)
+    parts = [bytes([FLAG_EBOOK if is_ebook else 0])]
+    for text in (book.title, book.author, book.isbn):
+        data = text.encode("utf-8")
+        parts.append(_varint(len(data)))
+        parts.append(data)
+    parts.append(_varint(book.copies))
+    parts.append(_varint(book.lent_copies))
+    if is_ebook:
+        parts.append(_SIZE.pack(float(book.download_size)))
+    return b"".join(parts)
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(f):
+    value = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("Truncated binary catalog file")
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+def _read_text(f):
+    length = _read_varint(f)
+    data = f.read(length)
+    if len(data) != length:
+        raise ValueError("Truncated binary catalog file")
+    return data.decode("utf-8")
+
+
+def _number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
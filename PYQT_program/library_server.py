@@ -0,0 +1,580 @@
+# library_server.py
+import argparse
+import http.client
+import http.server
+import itertools
+import json
+import select
+import sqlite3
+import threading
+import traceback
+import urllib.parse
+
+from book_library import (
+    BOOKS_ADDED, BOOKS_LENT, BOOKS_REMOVED, BOOKS_RETURNED, RESULT_OK, BookNotAvailableError, DuplicateISBNError,
+    Observable, Library, book_from_dict, book_to_dict, is_valid_isbn, isbn_key, normalize_isbn,
+)
+from catalog_storage import DURABILITY_MODES, WalStorage
+from sqlite_library import SqliteLibrary
+
+# Shared catalog for several desks: a small HTTP/1.1 JSON server over one
+# Library (or SqliteLibrary) and RemoteLibrary, a client with the same
+# interface that the GUIs can open instead of a local catalog.
+#
+#   GET    /stats                          {"count", "available", "lent", "version"}
+#   GET    /books?status=&order_by=&offset=&limit=
+#                                          {"total", "version", "books"}; status available/lent/omitted,
+#                                          order_by title/author/isbn or omitted (shelf order for a
+#                                          status, ISBN order for every book)
+#   GET    /books/<isbn>                   the holding of an ISBN, as a list of zero or one books
+#   GET    /authors?name=                  books by an author
+#   GET    /search?q=&limit=&offset=       ranked title/author search
+#   GET    /query?filter=&order_by=&limit=&cursor=&start=&stop=
+#                                          one sorted page, {"books", "cursor"}; see Library.query
+#   POST   /books?duplicates=              add one book (book_to_dict() form); 409 if its ISBN is
+#                                          held and the policy (the library's if omitted) is reject
+#   POST   /books/bulk?duplicates=         bulk_load a list of books, returns {"added"}
+#   POST   /upsert                         upsert one book, returns {"changed"}
+#   POST   /upsert_many                    upsert a list of books, returns {"changed"}
+#   DELETE /books/<isbn>                   remove every copy of an ISBN
+#   POST   /remove_many                    {"isbns"}, returns {"removed", "books"}
+#   POST   /lend, /return                  {"isbn"}, moves one copy and returns the book; 409 if not possible
+#   POST   /lend_many, /return_many        {"isbns"}, returns {"results": [[isbn, result], ...],
+#                                          "books": the books that changed}
+#
+# ISBNs may be sent in any form normalize_isbn() accepts; an invalid one in a
+# single-book request is a 400, like a book the catalog's constraints reject.
+# Any other failure is a 500 with the error in the reply.
+#
+# Connections are kept alive, so a desk pays for the TCP handshake once.
+
+DEFAULT_PORT = 8765
+
+# Most books one GET /books page returns
+MAX_PAGE = 10000
+
+
+# Raised by RemoteLibrary for replies that are not a success or a refusal
+class RemoteError(Exception):
+    pass
+
+# Requests RemoteLibrary may send again when the connection drops before the
+# reply: doing them twice does no harm
+IDEMPOTENT = ("GET", "DELETE")
+
+
+class LibraryRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # replies are small; don't wait to coalesce them
+    timeout = 300  # seconds an idle keep-alive connection is held open
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+        isbn = None
+        if path.startswith("/books/") and path != "/books/bulk":
+            path, isbn = "/books/<isbn>", urllib.parse.unquote(path[len("/books/"):])
+        route = ROUTES.get((method, path))
+        if route is None:
+            self._reply(404, {"error": f"No route for {method} {url.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            args = (self.server, query, body) if isbn is None else (self.server, isbn)
+            self._reply(200, route(*args))
+        except (BookNotAvailableError, DuplicateISBNError) as error:
+            # The type lets RemoteLibrary raise the same exception
+            self._reply(409, {"error": str(error), "type": type(error).__name__})
+        except (KeyError, TypeError, ValueError, sqlite3.IntegrityError) as error:
+            self._reply(400, {"error": f"Bad request: {error}"})
+        except Exception as error:
+            # Answered rather than left to end the connection, which the
+            # client would take for a keep-alive timeout
+            traceback.print_exc()
+            self._reply(500, {"error": f"Server error: {type(error).__name__}: {error}"})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+# Route handlers get the server plus the query string and JSON body, or the
+# ISBN from the path, and return the JSON reply
+
+def _stats(server, query, body):
+    library = server.library
+    return {"count": len(library), "available": library.available_count(), "lent": library.lent_count(),
+            "version": server.version}
+
+
+def _page(server, query, body):
+    library = server.library
+    version = server.version
+    status = query.get("status")
+    offset = int(query.get("offset", 0))
+    limit = min(int(query.get("limit", MAX_PAGE)), MAX_PAGE)
+    if "order_by" in query:
+        view = library.sorted_view(query["order_by"], status)
+        total = len(view)
+        books = [view[i] for i in range(offset, min(offset + limit, total))]
+    elif status is None:
+        # Every book in insertion order has no positional index, and skipping
+        # offset books of stream() made paging through them quadratic
+        view = library.sorted_view("isbn")
+        total = len(view)
+        books = [view[i] for i in range(offset, min(offset + limit, total))]
+    else:
+        view = {"available": library.available_view, "lent": library.lent_view}[status]()
+        total = len(view)
+        books = [view[i] for i in range(offset, min(offset + limit, total))]
+    return {"total": total, "version": version, "books": [book_to_dict(book) for book in books]}
+
+
+def _find(server, isbn):
+    return [book_to_dict(book) for book in server.library.find_books(isbn)]
+
+
+def _remove(server, isbn):
+    server.library.remove_book(isbn)
+    return {}
+
+
+# Unknown and invalid ISBNs are skipped, as remove_many skips them, rather
+# than failing the whole request
+def _remove_many(server, query, body):
+    library = server.library
+    keys = dict.fromkeys(isbn_key(isbn) for isbn in body["isbns"])
+    books = [book_to_dict(book) for key in keys if is_valid_isbn(key) for book in library.find_books(key)]
+    return {"removed": library.remove_many(keys), "books": books}
+
+
+def _by_author(server, query, body):
+    return [book_to_dict(book) for book in server.library.books_by_author(query["name"])]
+
+
+def _search(server, query, body):
+    books = server.library.search(query["q"], int(query.get("limit", 20)), int(query.get("offset", 0)))
+    return [book_to_dict(book) for book in books]
+
+
+def _query(server, query, body):
+    books, cursor = server.library.query(query.get("filter"), query.get("order_by", "title"),
+                                         min(int(query.get("limit", 50)), MAX_PAGE), query.get("cursor"),
+                                         query.get("start"), query.get("stop"))
+    return {"books": [book_to_dict(book) for book in books], "cursor": cursor}
+
+
+def _add(server, query, body):
+    server.library.add_book(book_from_dict(body), query.get("duplicates"))
+    return {}
+
+
+def _bulk(server, query, body):
+    return {"added": server.library.bulk_load((book_from_dict(data) for data in body), query.get("duplicates"))}
+
+
+def _upsert(server, query, body):
+    return {"changed": server.library.upsert_book(book_from_dict(body))}
+
+
+def _upsert_many(server, query, body):
+    return {"changed": server.library.upsert_many([book_from_dict(data) for data in body])}
+
+
+def _lend(server, query, body):
+    return book_to_dict(server.library.lend_book(body["isbn"]))
+
+
+def _return(server, query, body):
+    return book_to_dict(server.library.return_book(body["isbn"]))
+
+
+def _lend_many(server, query, body):
+    return _circulated(server.library, server.library.lend_many(body["isbns"]))
+
+
+def _return_many(server, query, body):
+    return _circulated(server.library, server.library.return_many(body["isbns"]))
+
+
+# Batch reply: the per-ISBN results plus the books that changed, which the
+# client passes on to its observers
+def _circulated(library, report):
+    books = []
+    for isbn in {isbn for isbn, result in report if result == RESULT_OK}:
+        books += [book_to_dict(book) for book in library.find_books(isbn)]
+    return {"results": report, "books": books}
+
+
+ROUTES = {
+    ("GET", "/stats"): _stats,
+    ("GET", "/books"): _page,
+    ("GET", "/books/<isbn>"): _find,
+    ("GET", "/authors"): _by_author,
+    ("GET", "/search"): _search,
+    ("GET", "/query"): _query,
+    ("POST", "/books"): _add,
+    ("POST", "/books/bulk"): _bulk,
+    ("POST", "/upsert"): _upsert,
+    ("POST", "/upsert_many"): _upsert_many,
+    ("DELETE", "/books/<isbn>"): _remove,
+    ("POST", "/remove_many"): _remove_many,
+    ("POST", "/lend"): _lend,
+    ("POST", "/return"): _return,
+    ("POST", "/lend_many"): _lend_many,
+    ("POST", "/return_many"): _return_many,
+}
+
+# One thread per connection. The Library must be safe to share between
+# threads, which Library and SqliteLibrary are.
+class LibraryServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # listen backlog; the default 5 drops connects when many desks start at once
+
+    def __init__(self, library, host="127.0.0.1", port=DEFAULT_PORT, verbose=False):
+        super().__init__((host, port), LibraryRequestHandler)
+        self.library = library
+        self.verbose = verbose
+        self.version = 0  # changes so far; lets clients tell when cached pages went stale
+        self._version_lock = threading.Lock()  # changes are announced on whichever thread made them
+        library.subscribe(self.on_library_changed)
+
+    def on_library_changed(self, event, books):
+        with self._version_lock:
+            self.version += 1
+
+    def server_close(self):
+        super().server_close()
+        self.library.unsubscribe(self.on_library_changed)
+
+
+# Client with the Library interface, talking to a LibraryServer. Each thread
+# keeps its own keep-alive connection. Observers hear about the changes made
+# through this client; other desks' changes show up in the views as soon as
+# they fetch a page.
+class RemoteLibrary(Observable):
+    BATCH = 5000  # books per POST /books/bulk request
+
+    def __init__(self, url, timeout=30):
+        super().__init__()
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "http":
+            raise ValueError(f"Only http:// library servers are supported, not {url!r}")
+        self.host = parts.hostname
+        self.port = parts.port or DEFAULT_PORT
+        self.timeout = timeout
+        self.version = 0  # bumped on every local change, like SqliteLibrary
+        self._local = threading.local()
+
+    def _request(self, method, path, body=None, query=None):
+        if query:
+            path += "?" + urllib.parse.urlencode(query)
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, data, headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Most likely the server closed the keep-alive connection just
+                # now; but it may have carried out the request, so only
+                # requests that are safe to repeat are sent again
+                conn.close()
+                self._local.conn = None
+                if attempt or method not in IDEMPOTENT:
+                    raise
+        if response.status == 409:
+            if payload.get("type") == "DuplicateISBNError":
+                raise DuplicateISBNError(payload["error"])
+            raise BookNotAvailableError(payload["error"])
+        if response.status != 200:
+            raise RemoteError(payload.get("error", f"HTTP {response.status}"))
+        return payload
+
+    # This thread's keep-alive connection. One the server closed while it
+    # sat idle reads as ready (at EOF); it is replaced before anything is
+    # sent on it, so a stale connection doesn't fail a request that can't be
+    # retried.
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def add_book(self, book, duplicates=None):
+        self._request("POST", "/books", book_to_dict(book), _policy_query(duplicates))
+        self._notify(BOOKS_ADDED, [book])
+
+    # Sent in batches of BATCH books; under "reject" the batches before the
+    # one holding a duplicate stay loaded
+    def bulk_load(self, books, duplicates=None):
+        added = []
+        for batch in _batches(books, self.BATCH):
+            self._request("POST", "/books/bulk", [book_to_dict(book) for book in batch], _policy_query(duplicates))
+            added += batch
+        self._notify(BOOKS_ADDED, added)
+        return len(added)
+
+    def upsert_book(self, book):
+        old = self.find_books(book.isbn) if self._observers else []
+        changed = self._request("POST", "/upsert", book_to_dict(book))["changed"]
+        if changed:
+            self._notify(BOOKS_REMOVED, old)
+            self._notify(BOOKS_ADDED, [book])
+        return changed
+
+    def upsert_many(self, books):
+        books = list(books)
+        changed = 0
+        for batch in _batches(books, self.BATCH):
+            changed += self._request("POST", "/upsert_many", [book_to_dict(book) for book in batch])["changed"]
+        if changed:
+            # The server only reports how many changed; observers get every book sent
+            self._notify(BOOKS_ADDED, list(books))
+        return changed
+
+    # Single-ISBN calls check the ISBN here, raising InvalidISBNError like Library
+    def remove_book(self, isbn):
+        isbn = normalize_isbn(isbn)
+        removed = self.find_books(isbn) if self._observers else []
+        self._request("DELETE", "/books/" + urllib.parse.quote(isbn, safe=""))
+        self._notify(BOOKS_REMOVED, removed)
+
+    def remove_many(self, isbns):
+        reply = self._request("POST", "/remove_many", {"isbns": list(isbns)})
+        self._notify(BOOKS_REMOVED, _books(reply["books"]))
+        return reply["removed"]
+
+    def find_books(self, isbn):
+        return _books(self._request("GET", "/books/" + urllib.parse.quote(normalize_isbn(isbn), safe="")))
+
+    def lend_book(self, isbn):
+        book = book_from_dict(self._request("POST", "/lend", {"isbn": normalize_isbn(isbn)}))
+        self._notify(BOOKS_LENT, [book])
+        return book
+
+    def return_book(self, isbn):
+        book = book_from_dict(self._request("POST", "/return", {"isbn": normalize_isbn(isbn)}))
+        self._notify(BOOKS_RETURNED, [book])
+        return book
+
+    def lend_many(self, isbns):
+        return self._circulate_many("/lend_many", isbns, BOOKS_LENT)
+
+    def return_many(self, isbns):
+        return self._circulate_many("/return_many", isbns, BOOKS_RETURNED)
+
+    def _circulate_many(self, path, isbns, event):
+        reply = self._request("POST", path, {"isbns": list(isbns)})
+        self._notify(event, _books(reply["books"]))
+        return [tuple(pair) for pair in reply["results"]]
+
+    def __iter__(self):
+        return self.stream("available")
+
+    def lent_books(self):
+        return self.stream("lent")
+
+    def _stats(self):
+        return self._request("GET", "/stats")
+
+    def __len__(self):
+        return self._stats()["count"]
+
+    def available_count(self):
+        return self._stats()["available"]
+
+    def lent_count(self):
+        return self._stats()["lent"]
+
+    def search(self, query, limit=20, offset=0):
+        return _books(self._request("GET", "/search", query={"q": query, "limit": limit, "offset": offset}))
+
+    def query(self, filter=None, order_by="title", limit=50, cursor=None, start=None, stop=None):
+        params = {"order_by": order_by, "limit": limit}
+        for name, value in (("filter", filter), ("cursor", cursor), ("start", start), ("stop", stop)):
+            if value is not None:
+                params[name] = value
+        reply = self._request("GET", "/query", query=params)
+        return _books(reply["books"]), reply["cursor"]
+
+    def available_view(self):
+        return _RemoteView(self, "available")
+
+    def lent_view(self):
+        return _RemoteView(self, "lent")
+
+    def sorted_view(self, order_by="title", status=None):
+        return _RemoteView(self, status, order_by)
+
+    def books_by_author(self, author):
+        return iter(_books(self._request("GET", "/authors", query={"name": author})))
+
+    # Every book comes from /query in ISBN order, each page resuming after
+    # the last one's cursor, so the server never skips over books already
+    # sent; a status pages the server's shelf by offset, which is positional.
+    def stream(self, status=None, chunk_size=1000):
+        if status is None:
+            cursor = None
+            while True:
+                books, cursor = self.query(order_by="isbn", limit=chunk_size, cursor=cursor)
+                yield from books
+                if cursor is None:
+                    return
+        query = {"limit": chunk_size, "status": status}
+        offset = 0
+        while True:
+            query["offset"] = offset
+            books = _books(self._request("GET", "/books", query=query)["books"])
+            yield from books
+            if len(books) < chunk_size:
+                return
+            offset += len(books)
+
+    def _notify(self, event, books):
+        self.version += 1
+        super()._notify(event, books)
+
+    def flush(self):
+        pass  # the server owns the storage
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _batches(books, size):
+    books = iter(books)
+    while True:
+        batch = list(itertools.islice(books, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _policy_query(duplicates):
+    return None if duplicates is None else {"duplicates": duplicates}
+
+
+def _books(dicts):
+    return [book_from_dict(data) for data in dicts]
+
+
+# Sequence over one status of the server's books (or all of them), in
+# shelf or ISBN order or a sort order, fetched a page at a time.
+# Pages are cached until this client changes something or a fetched page
+# shows the server has changed since, so scrolling costs one request per
+# page that comes on screen.
+class _RemoteView:
+    PAGE_SIZE = 500
+    CACHED_PAGES = 8
+
+    def __init__(self, library, status, order_by=None):
+        self._library = library
+        self._query = {} if status is None else {"status": status}
+        if order_by is not None:
+            self._query["order_by"] = order_by
+        self._version = None  # client version the cache belongs to
+        self._server_version = None
+        self._count = 0
+        self._pages = {}
+
+    def _check_version(self):
+        if self._version != self._library.version:
+            self._version = self._library.version
+            self._pages = {}
+            self._fetch(0)
+
+    def _fetch(self, number):
+        reply = self._library._request("GET", "/books", query={
+            **self._query, "offset": number * self.PAGE_SIZE, "limit": self.PAGE_SIZE,
+        })
+        if reply["version"] != self._server_version:
+            # Another desk changed the catalog; every cached page may be off
+            self._server_version = reply["version"]
+            self._pages = {}
+        self._count = reply["total"]
+        if len(self._pages) >= self.CACHED_PAGES:
+            del self._pages[next(iter(self._pages))]
+        page = self._pages[number] = _books(reply["books"])
+        return page
+
+    def __len__(self):
+        self._check_version()
+        return self._count
+
+    def __getitem__(self, index):
+        self._check_version()
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("view index out of range")
+        number, offset = divmod(index, self.PAGE_SIZE)
+        page = self._pages.get(number)
+        if page is None:
+            page = self._fetch(number)
+        if offset >= len(page):
+            raise IndexError("view index out of range")
+        return page[offset]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a library catalog to several desks over HTTP")
+    parser.add_argument("catalog", nargs="?", default="library_data",
+                        help="catalog directory, or a .db/.sqlite file for a SQLite catalog")
+    parser.add_argument("--memory", action="store_true", help="keep the catalog in memory only")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument("--durability", default="batch", choices=DURABILITY_MODES)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    if args.memory:
+        library = Library()
+    elif args.catalog.endswith((".db", ".sqlite", ".sqlite3")):
+        library = SqliteLibrary(args.catalog)
+    else:
+        library = Library(storage=WalStorage(args.catalog, durability=args.durability))
+    if isinstance(library, Library):
+        library.build_search_index()
+    server = LibraryServer(library, args.host, args.port, args.verbose)
+    host, port = server.server_address[:2]
+    print(f"Serving library on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
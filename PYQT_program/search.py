@@ -0,0 +1,364 @@
+# search.py
+import heapq
+import itertools
+import math
+import threading
+
+from book_library import BOOKS_ADDED, BOOKS_REMOVED, normalize_text
+from sorted_index import SortedIndex
+
+# Ranking points per query term, by where and how the term matched; the best
+# match of each term counts and a book's score is the sum over all terms
+TITLE_WORD, TITLE_PREFIX, TITLE_SUBSTRING = 6, 4, 2
+AUTHOR_WORD, AUTHOR_PREFIX, AUTHOR_SUBSTRING = 5, 3, 1
+
+# Shortest term the trigram index can answer; shorter ones use the trie
+TRIGRAM = 3
+
+# Match sets of up to this many books are gathered and sorted. Larger ones
+# (terms of a letter or two, very common words) are walked in title order
+# instead, which stops as soon as enough results are found.
+EXPAND_LIMIT = 5000
+
+# Books a title-order walk looks at before it gives up and gathers the
+# match set after all
+SCAN_LIMIT = 10000
+
+# A query of several terms that all match more than EXPAND_LIMIT books only
+# ranks its first RANKED_LIMIT matches in title order
+RANKED_LIMIT = 500
+
+
+def trigrams(text):
+    return {text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1)}
+
+
+TITLE, AUTHOR = 0, 1
+
+
+# Type-ahead search over the titles and authors of a Library. Every word is
+# stored in a prefix trie per field, which answers whole words and prefixes
+# ("ha" -> "harry", "hamlet"); every field is also in a trigram index, which
+# finds fragments inside words ("arry" -> "harry"). All terms of a query must
+# match. Results are ranked by score, then title. Scores come from set
+# operations on the match sets, and only the top score tiers get sorted;
+# match sets too large for that are read in title order (see EXPAND_LIMIT),
+# so every query costs about the same whatever the catalog size.
+# Library.search() subscribes the index to the library, which then follows
+# add_book/bulk_load/remove_book incrementally. A lock makes it safe to
+# search from a worker thread while the library changes.
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._books = {}  # id(book) -> book
+        self._keys = {}  # id(book) -> (normalized title, normalized author)
+        # One trie per field: char -> child node; the None key holds the ids
+        # of books with a word ending at that node
+        self._tries = ({}, {})
+        self._trigrams = {}  # trigram -> ids of books whose title or author contains it
+        self._by_title = None  # SortedIndex of the books by normalized title, built on first use
+
+    def on_library_changed(self, event, books):
+        if event == BOOKS_ADDED:
+            self.add_books(books)
+        elif event == BOOKS_REMOVED:
+            self.remove_books(books)
+
+    def __len__(self):
+        return len(self._books)
+
+    def add_books(self, books):
+        with self._lock:
+            self._add(books)
+
+    def _add(self, books):
+        added = []
+        for book in books:
+            key = id(book)
+            if key in self._books:
+                continue
+            added.append(book)
+            fields = (normalize_text(book.title), normalize_text(book.author))
+            self._books[key] = book
+            self._keys[key] = fields
+            for trie, text in zip(self._tries, fields):
+                for word in set(text.split()):
+                    node = trie
+                    for char in word:
+                        node = node.setdefault(char, {})
+                    node.setdefault(None, set()).add(key)
+            for gram in trigrams(fields[TITLE]) | trigrams(fields[AUTHOR]):
+                self._trigrams.setdefault(gram, set()).add(key)
+        if self._by_title is not None:
+            self._by_title.on_library_changed(BOOKS_ADDED, added)
+
+    def remove_books(self, books):
+        with self._lock:
+            self._remove(books)
+
+    def _remove(self, books):
+        books = [book for book in books if id(book) in self._books]
+        if self._by_title is not None:
+            self._by_title.on_library_changed(BOOKS_REMOVED, books)  # its keys are read from _keys
+        for book in books:
+            key = id(book)
+            fields = self._keys.pop(key)
+            del self._books[key]
+            for trie, text in zip(self._tries, fields):
+                for word in set(text.split()):
+                    _remove_word(trie, word, key)
+            for gram in trigrams(fields[TITLE]) | trigrams(fields[AUTHOR]):
+                ids = self._trigrams[gram]
+                ids.discard(key)
+                if not ids:
+                    del self._trigrams[gram]
+
+    # Ranked books matching every term of `query`, skipping `offset` and
+    # returning at most `limit`
+    def search(self, query, limit=20, offset=0):
+        terms = normalize_text(query).split()
+        if not terms:
+            return []
+        with self._lock:
+            return self._search(terms, limit, offset)
+
+    # Build the title order that large match sets are read in now, rather
+    # than on the first query that needs it. Called on an empty index, the
+    # order then grows with each add_books() instead of being sorted at once.
+    def sort_titles(self):
+        with self._lock:
+            self._titles()
+
+    def _titles(self):
+        if self._by_title is None:
+            self._by_title = SortedIndex(self._order, self._books.values())
+        return self._by_title
+
+    # Title order of the results: normalized title, then ISBN
+    def _order(self, book):
+        return self._keys[id(book)][TITLE], book.isbn
+
+    def _search(self, terms, limit, offset):
+        count = offset + limit
+        if len(terms) == 1:
+            top = self._top_term(terms[0], count)
+        else:
+            top = self._top_terms(terms, count)
+        return [self._books[key] for key in top[offset:]]
+
+    def _top_term(self, term, count):
+        if self._estimate(term) <= EXPAND_LIMIT:
+            levels = self._levels(term)
+            return self._top(_disjoint(levels[:-1], levels[-1][1]), count)
+        # Too many matches to score them all: take each score tier in turn,
+        # from its first books in title order
+        top = []
+        for points, size, gather in self._tier_sources(term):
+            wanted = count - len(top)
+            if wanted <= 0:
+                break
+            top += self._first(lambda fields: _points(term, fields) == points, size, gather, wanted)
+        return top
+
+    def _top_terms(self, terms, count):
+        estimates = {term: self._estimate(term) for term in terms}
+        terms.sort(key=estimates.get)
+        keys = self._keys
+        if estimates[terms[0]] <= EXPAND_LIMIT:
+            # Index lookups for the most selective term only; the few books it
+            # leaves are checked against the other terms directly
+            candidates = self._levels(terms[0])[-1][1]
+            for term in terms[1:]:
+                candidates = {key for key in candidates if _points(term, keys[key])}
+        else:
+            # Every term is common: rank only the first matches in title order
+            candidates = self._first(
+                _matcher(terms), math.inf, lambda: self._levels(terms[0])[-1][1], max(RANKED_LIMIT, count), count,
+            )
+        scores = {}
+        for key in candidates:
+            score = sum(_points(term, keys[key]) for term in terms)
+            scores.setdefault(score, set()).add(key)
+        return self._top(sorted(scores.items(), reverse=True), count)
+
+    # Upper bound on the books a term matches, used to order terms and to
+    # tell small match sets from large ones; no more than EXPAND_LIMIT + 1
+    # for short terms, so it costs O(EXPAND_LIMIT) at most
+    def _estimate(self, term):
+        if len(term) < TRIGRAM:
+            return sum(_count_words(_node(trie, term), EXPAND_LIMIT) for trie in self._tries)
+        return min(len(self._trigrams.get(gram, ())) for gram in trigrams(term))
+
+    # For one term, from best to worst match kind: (points, bound on the
+    # books scoring them, function gathering a superset of those books)
+    def _tier_sources(self, term):
+        title, author = (_node(trie, term) for trie in self._tries)
+        title_word = title.get(None, set()) if title else set()
+        author_word = author.get(None, set()) if author else set()
+        sources = [
+            (TITLE_WORD, len(title_word), lambda: title_word),
+            (AUTHOR_WORD, len(author_word), lambda: author_word),
+            (TITLE_PREFIX, _count_words(title, EXPAND_LIMIT), lambda: _words_below(title)),
+            (AUTHOR_PREFIX, _count_words(author, EXPAND_LIMIT), lambda: _words_below(author)),
+        ]
+        if len(term) >= TRIGRAM:
+            grams = sorted((self._trigrams.get(gram, set()) for gram in trigrams(term)), key=len)
+            inside = lambda: set(grams[0]).intersection(*grams[1:])
+            sources.append((TITLE_SUBSTRING, len(grams[0]), inside))
+            sources.append((AUTHOR_SUBSTRING, len(grams[0]), inside))
+        return sources
+
+    # The first `wanted` ids in title order whose (title, author) pass
+    # `test`. With `size` (a bound on how many pass) up to EXPAND_LIMIT,
+    # gather() supplies a superset to filter and sort. Otherwise the books
+    # are walked in title order, up to SCAN_LIMIT of them; a walk that finds
+    # fewer than `enough` falls back to gather().
+    def _first(self, test, size, gather, wanted, enough=None):
+        keys = self._keys
+        if size > EXPAND_LIMIT:
+            titles = self._titles()
+            walk = itertools.islice(titles.scan(), SCAN_LIMIT)
+            found = list(itertools.islice((id(book) for book in walk if test(keys[id(book)])), wanted))
+            if len(found) >= (wanted if enough is None else enough) or len(titles) <= SCAN_LIMIT:
+                return found
+        books = self._books
+        return heapq.nsmallest(wanted, (key for key in gather() if test(keys[key])),
+                               key=lambda key: self._order(books[key]))
+
+    # For one term: (points, ids) pairs from best to worst match kind; the
+    # last pair is (0, every id the term matches)
+    def _levels(self, term):
+        title_word, title_prefix = _words(self._tries[TITLE], term)
+        author_word, author_prefix = _words(self._tries[AUTHOR], term)
+        title_substring = author_substring = set()
+        if len(term) >= TRIGRAM:
+            grams = sorted((self._trigrams.get(gram, set()) for gram in trigrams(term)), key=len)
+            # Trigrams can all be present without being contiguous, so confirm
+            # the substring, but only for books the tries haven't matched
+            inside = set(grams[0]).intersection(*grams[1:]) - title_prefix - author_prefix
+            title_substring = {key for key in inside if term in self._keys[key][TITLE]}
+            author_substring = {key for key in inside - title_substring if term in self._keys[key][AUTHOR]}
+        return [
+            (TITLE_WORD, title_word), (AUTHOR_WORD, author_word),
+            (TITLE_PREFIX, title_prefix), (AUTHOR_PREFIX, author_prefix),
+            (TITLE_SUBSTRING, title_substring), (AUTHOR_SUBSTRING, author_substring),
+            (0, title_prefix | author_prefix | title_substring | author_substring),
+        ]
+
+    # The first `count` ids over the tiers, each tier in title order
+    def _top(self, tiers, count):
+        books = self._books
+        order = lambda key: self._order(books[key])
+        top = []
+        for _, tier in tiers:
+            wanted = count - len(top)
+            if wanted <= 0:
+                break
+            top.extend(sorted(tier, key=order) if len(tier) <= wanted else heapq.nsmallest(wanted, tier, key=order))
+        return top
+
+
+# Turn best-first (points, ids) levels into disjoint tiers over `candidates`
+def _disjoint(levels, candidates):
+    tiers = []
+    for points, ids in levels:
+        tier = candidates & ids
+        if tier:
+            tiers.append((points, tier))
+            candidates = candidates - tier
+    return tiers
+
+
+# Test of a book's normalized (title, author) that is true if every term
+# matches it, like _points() > 0 for each but without scoring
+def _matcher(terms):
+    # Short terms must start a word; words never contain spaces, so a term
+    # can't match across the space between title and author
+    needles = [f" {term}" if len(term) < TRIGRAM else term for term in terms]
+    return lambda fields: all(needle in f" {fields[TITLE]} {fields[AUTHOR]}" for needle in needles)
+
+
+# Points one term earns against a book's normalized (title, author); 0 if it doesn't match
+def _points(term, fields):
+    title, author = fields
+    return max(
+        _field_points(term, title, TITLE_WORD, TITLE_PREFIX, TITLE_SUBSTRING),
+        _field_points(term, author, AUTHOR_WORD, AUTHOR_PREFIX, AUTHOR_SUBSTRING),
+    )
+
+
+def _field_points(term, text, word_points, prefix_points, substring_points):
+    if term not in text:
+        return 0
+    # Normalized text has single spaces between words, so padding it with
+    # spaces finds whole words and word starts without splitting it
+    padded = f" {text} "
+    if f" {term} " in padded:
+        return word_points
+    if f" {term}" in padded:
+        return prefix_points
+    # Short terms only match word prefixes, like the trie lookups
+    return substring_points if len(term) >= TRIGRAM else 0
+
+
+# Ids of books with `term` as a whole word, and with a word starting with it
+def _words(trie, term):
+    node = _node(trie, term)
+    if node is None:
+        return set(), set()
+    return set(node.get(None, ())), _words_below(node)
+
+
+# The trie node reached by spelling `term`, or None
+def _node(trie, term):
+    node = trie
+    for char in term:
+        node = node.get(char)
+        if node is None:
+            return None
+    return node
+
+
+# Ids of books with a word ending at or below a node (None for no node)
+def _words_below(node):
+    found = set()
+    stack = [node] if node else []
+    while stack:
+        current = stack.pop()
+        for char, child in current.items():
+            if char is None:
+                found |= child
+            else:
+                stack.append(child)
+    return found
+
+
+# Words ending at or below a node (None for no node), counted only until
+# they pass `cap`
+def _count_words(node, cap):
+    total = 0
+    stack = [node] if node else []
+    while stack and total <= cap:
+        current = stack.pop()
+        for char, child in current.items():
+            if char is None:
+                total += len(child)
+            else:
+                stack.append(child)
+    return total
+
+
+def _remove_word(trie, word, key):
+    path = [trie]
+    for char in word:
+        path.append(path[-1][char])
+    ids = path[-1][None]
+    ids.discard(key)
+    if ids:
+        return
+    del path[-1][None]
+    # Prune nodes left without words below them
+    for depth in range(len(word), 0, -1):
+        if path[depth]:
+            break
+        del path[depth - 1][word[depth - 1]]
@@ -0,0 +1,770 @@
+# sqlite_library.py
+import bisect
+import collections
+import sqlite3
+import string
+import threading
+
+from book_library import (
+    BOOKS_ADDED, BOOKS_LENT, BOOKS_REMOVED, BOOKS_RETURNED, DUPLICATE_POLICIES, DUPLICATES_MERGE,
+    DUPLICATES_REJECT, DUPLICATES_REPLACE, RESULT_ALREADY_LENT, RESULT_NOT_LENT, RESULT_OK, RESULT_UNKNOWN,
+    BookNotAvailableError, DuplicateISBNError, EBook, Observable, decode_cursor, encode_cursor, isbn_key,
+    is_valid_isbn, normalize_author, normalize_isbn, normalize_text, stored_book,
+)
+
+# One row per title (holding) with its copy counts
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    author_key TEXT NOT NULL,
+    isbn TEXT NOT NULL,
+    copies INTEGER NOT NULL DEFAULT 1,
+    lent_copies INTEGER NOT NULL DEFAULT 0 CHECK (lent_copies BETWEEN 0 AND copies),
+    download_size NUMERIC CHECK (download_size IS NULL OR typeof(download_size) IN ('integer', 'real'))
+);
+"""
+
+# Catalogs from before holdings kept one row per copy with an is_lent flag;
+# fold each ISBN's rows into its first one
+MIGRATE_COPIES = """
+BEGIN;
+ALTER TABLE books ADD COLUMN copies INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE books ADD COLUMN lent_copies INTEGER NOT NULL DEFAULT 0;
+DROP INDEX IF EXISTS books_isbn;
+DROP INDEX IF EXISTS books_is_lent;
+CREATE INDEX books_isbn_migrate ON books (isbn, id);
+UPDATE books SET (copies, lent_copies) = (
+    SELECT COUNT(*), SUM(is_lent) FROM books AS copy WHERE copy.isbn = books.isbn
+) WHERE id = (SELECT MIN(id) FROM books AS copy WHERE copy.isbn = books.isbn);
+DELETE FROM books WHERE id > (SELECT MIN(id) FROM books AS copy WHERE copy.isbn = books.isbn);
+DROP INDEX books_isbn_migrate;
+ALTER TABLE books DROP COLUMN is_lent;
+COMMIT;
+"""
+
+# Catalogs from before ISBN normalization may hold ISBN-10s, hyphenated
+# ISBNs or text that is no ISBN at all; see SqliteLibrary._migrate_isbns.
+# Rows with an invalid ISBN are moved to this side table, with the columns
+# the books table had then, so nothing is lost but no bad key is served.
+QUARANTINE_SCHEMA = "CREATE TABLE IF NOT EXISTS books_quarantine AS SELECT * FROM books WHERE 0"
+
+# PRAGMA user_version once the ISBNs are canonical. Version 1 left a row
+# whose canonical ISBN another row held in its old form; version 2 merges
+# those and quarantines invalid ones.
+ISBN_VERSION = 2
+
+# Holds every ISBN once; also the conflict target of the upserts
+ISBN_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS books_isbn ON books (isbn)"
+
+# Secondary indexes: name -> indexed table and column(s). The partial ones
+# list just the titles with a copy on the shelf or out on loan.
+INDEXES = {
+    "books_author_key": "books (author_key)",
+    "books_title_order": "books (title COLLATE NOCASE, isbn)",
+    "books_author_order": "books (author_key, title COLLATE NOCASE, isbn)",
+    "books_available": "books (id) WHERE lent_copies < copies",
+    "books_lent": "books (id) WHERE lent_copies > 0",
+}
+
+COLUMNS = "id, title, author, isbn, copies, lent_copies, download_size"
+
+# Sort orders of query(), as the columns of a row value; each has an index above
+ORDER_COLUMNS = {
+    "title": ("title COLLATE NOCASE", "isbn"),
+    "author": ("author_key", "title COLLATE NOCASE", "isbn"),
+    "isbn": ("isbn",),
+}
+
+AVAILABLE = "lent_copies < copies"
+LENT = "lent_copies > 0"
+
+# Rows of each status (None: every row), as a WHERE clause and as a test of
+# a row in COLUMNS order
+STATUS_WHERE = {None: "1", "available": AVAILABLE, "lent": LENT}
+STATUS_ROWS = {None: lambda row: True, "available": lambda row: row[5] < row[4], "lent": lambda row: row[5] > 0}
+
+# Sort key of a row (in COLUMNS order) for each _RowView order, None being
+# id order. Compares in Python the way ORDER_COLUMNS sort in SQLite (NOCASE
+# only folds ASCII letters), and works as the values of a keyset seek.
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+ROW_KEYS = {
+    None: lambda row: (row[0],),
+    "title": lambda row: (row[1].translate(_ASCII_LOWER), row[3]),
+    "author": lambda row: (normalize_author(row[2]), row[1].translate(_ASCII_LOWER), row[3]),
+    "isbn": lambda row: (row[3],),
+}
+
+# Row changes remembered for the views, which replay them to keep their
+# cached positions; a view further behind starts over
+CHANGE_LOG_SIZE = 10000
+
+INSERT = """
+INSERT INTO books (title, author, author_key, isbn, copies, lent_copies, download_size) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# INSERT statement per duplicates policy; "reject" relies on the unique ISBN index
+INSERTS = {
+    # Add the book's copies to the row already holding its ISBN
+    DUPLICATES_MERGE: INSERT + """
+ON CONFLICT (isbn) DO UPDATE SET copies = copies + excluded.copies, lent_copies = lent_copies + excluded.lent_copies
+""",
+    # Overwrite the held row, keeping its copies on loan; an identical row is
+    # left untouched (no change counted), like Library.upsert_book
+    DUPLICATES_REPLACE: INSERT + """
+ON CONFLICT (isbn) DO UPDATE SET title = excluded.title, author = excluded.author, author_key = excluded.author_key,
+    copies = max(excluded.copies, lent_copies), download_size = excluded.download_size
+WHERE title IS NOT excluded.title OR author IS NOT excluded.author OR copies IS NOT max(excluded.copies, lent_copies)
+    OR download_size IS NOT excluded.download_size
+""",
+    DUPLICATES_REJECT: INSERT,
+}
+
+# Trigram full-text index over title and author, kept in step by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE books_fts USING fts5(title, author, content='books', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER books_fts_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+CREATE TRIGGER books_fts_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+END;
+CREATE TRIGGER books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+INSERT INTO books_fts (books_fts) VALUES ('rebuild');
+"""
+
+# Word index over title and author with prefix indexes for one and two
+# characters, for the search terms too short for the trigram index. Case is
+# folded, accents are kept, as normalize_text() does.
+WORDS_SCHEMA = """
+CREATE VIRTUAL TABLE books_words USING fts5(
+    title, author, content='books', content_rowid='id', tokenize='unicode61 remove_diacritics 0', prefix='1 2'
+);
+CREATE TRIGGER books_words_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_words (rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+CREATE TRIGGER books_words_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_words (books_words, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+END;
+CREATE TRIGGER books_words_update AFTER UPDATE OF title, author ON books BEGIN
+    INSERT INTO books_words (books_words, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    INSERT INTO books_words (rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+INSERT INTO books_words (books_words) VALUES ('rebuild');
+"""
+
+# Shortest term the trigram index can answer
+TRIGRAM = 3
+
+# Rows of each step of search()'s walk in title order for short terms; it
+# reads at most their sum before it turns to the word index
+SEARCH_WALK = (250, 1000, 4000)
+
+# Rows fetched per round trip when streaming query results
+PAGE_SIZE = 1000
+
+# Library with the same interface, kept in a local SQLite file. Queries stream
+# rows page by page, so a catalog of any size is never loaded into memory.
+# The connection may be used from any thread; self.lock serializes access.
+class SqliteLibrary(Observable):
+    def __init__(self, path, duplicates=DUPLICATES_MERGE):
+        super().__init__()
+        self.duplicates = duplicates
+        self._policy(None)
+        self.version = 0  # bumped on every change so _RowView caches know to reload
+        self._changes = collections.deque(maxlen=CHANGE_LOG_SIZE)  # (version, old row, new row)
+        self._forgotten = 0  # changes up to this version are no longer in _changes
+        self._counts = None  # status -> number of rows, counted on first use and then kept up to date
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.create_function("isbn_key", 1, isbn_key, deterministic=True)
+        self.conn.create_function("is_valid_isbn", 1, is_valid_isbn, deterministic=True)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < ISBN_VERSION:
+            self._migrate_isbns()
+        if "is_lent" in {row[1] for row in self.conn.execute("PRAGMA table_info(books)")}:
+            self.conn.executescript(MIGRATE_COPIES)
+        self.conn.execute(ISBN_INDEX)
+        self._create_indexes()
+        self.conn.create_function("fold", 1, normalize_author, deterministic=True)
+        self.has_fts = self._create_fts("books_fts", FTS_SCHEMA)
+        # Checked on its own: catalogs from before it get it on their next open
+        self.has_words = self.has_fts and self._create_fts("books_words", WORDS_SCHEMA)
+
+    # Rewrite every valid ISBN to its canonical ISBN-13 and quarantine the
+    # invalid ones. A row whose canonical ISBN another row already holds is
+    # merged into that row: its copies are added, the record kept is the
+    # other row's, like add_book() under "merge". Runs before the copies
+    # migration, whose per-copy rows of one title just get the same ISBN
+    # and are folded together there.
+    def _migrate_isbns(self):
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(books)")}
+        with self.conn:
+            self.conn.execute(QUARANTINE_SCHEMA)
+            self.conn.execute("INSERT INTO books_quarantine SELECT * FROM books WHERE NOT is_valid_isbn(isbn)")
+            self.conn.execute("DELETE FROM books WHERE NOT is_valid_isbn(isbn)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS books_isbn_migrate ON books (isbn)")
+            rows = self.conn.execute("SELECT id, isbn_key(isbn) FROM books WHERE isbn != isbn_key(isbn) ORDER BY id")
+            for row_id, key in rows.fetchall():
+                held = self.conn.execute("SELECT id FROM books WHERE isbn = ?", (key,)).fetchone()
+                if held is None or "is_lent" in columns:
+                    self.conn.execute("UPDATE books SET isbn = ? WHERE id = ?", (key, row_id))
+                    continue
+                self.conn.execute(
+                    "UPDATE books SET (copies, lent_copies) = ("
+                    "SELECT books.copies + merged.copies, books.lent_copies + merged.lent_copies "
+                    "FROM books AS merged WHERE merged.id = ?) WHERE id = ?", (row_id, held[0]))
+                self.conn.execute("DELETE FROM books WHERE id = ?", (row_id,))
+            self.conn.execute("DROP INDEX books_isbn_migrate")
+            self.conn.execute(f"PRAGMA user_version = {ISBN_VERSION}")
+
+    # Set up a full-text index on first open; False if this SQLite build lacks FTS5
+    def _create_fts(self, name, schema):
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone():
+            return True
+        try:
+            self.conn.executescript(f"BEGIN; {schema} COMMIT;")
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+            return False
+        return True
+
+    def _create_indexes(self):
+        for name, definition in INDEXES.items():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+    # An ISBN already held follows the duplicates policy, like Library.add_book
+    def add_book(self, book, duplicates=None):
+        policy = self._policy(duplicates)
+        if policy == DUPLICATES_REPLACE:
+            self.upsert_book(book)
+            return
+        with self.lock, self.conn:
+            old = self._row(book.isbn)
+            self._insert(INSERTS[policy], book)
+            new = self._row(book.isbn)
+            self._record([(old, new)])
+        self._notify(BOOKS_ADDED, [_row_to_book(new)])
+
+    # See Library.upsert_book; returns True if the catalog changed
+    def upsert_book(self, book):
+        return self.upsert_many([book]) == 1
+
+    # Upsert many books in one transaction; returns the number of ISBNs inserted or changed
+    def upsert_many(self, books):
+        changed = {}  # ISBN -> (row before the batch, row after), in the order they changed
+        with self.lock, self.conn:
+            for book in books:
+                old = self._row(book.isbn)
+                before = self.conn.total_changes
+                self._insert(INSERTS[DUPLICATES_REPLACE], book)
+                if self.conn.total_changes != before:
+                    first = changed.get(book.isbn)
+                    changed[book.isbn] = (old if first is None else first[0], self._row(book.isbn))
+            if changed:
+                self._record(changed.values())
+        if self._observers:
+            self._notify(BOOKS_REMOVED, [_row_to_book(old) for old, _ in changed.values() if old is not None])
+            self._notify(BOOKS_ADDED, [_row_to_book(new) for _, new in changed.values()])
+        return len(changed)
+
+    def _policy(self, duplicates):
+        policy = self.duplicates if duplicates is None else duplicates
+        if policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicates must be one of {DUPLICATE_POLICIES}, not {policy!r}")
+        return policy
+
+    def _insert(self, sql, book):
+        try:
+            self.conn.execute(sql, _book_row(book, normalize_author(book.author)))
+        except sqlite3.IntegrityError as exc:
+            raise _integrity_error(exc, book) from None
+
+    # Insert many books in one transaction, following the duplicates policy.
+    # The secondary indexes are dropped first and rebuilt once at the end,
+    # which is much cheaper than updating them row by row. Unlike Library,
+    # a failure (a rejected duplicate, a row the table refuses, an error
+    # from the iterable) rolls back the whole load, dropped indexes
+    # included. Returns the number of books read.
+    def bulk_load(self, books, duplicates=None):
+        sql = INSERTS[self._policy(duplicates)]
+        author_keys = {}  # author -> normalized key, so each distinct name is folded once
+        count = 0
+        current = None  # the book being inserted, for error messages
+
+        def rows():
+            nonlocal count, current
+            for book in books:
+                key = author_keys.get(book.author)
+                if key is None:
+                    key = author_keys[book.author] = normalize_author(book.author)
+                count += 1
+                current = book
+                yield _book_row(book, key)
+
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM books").fetchone()[0]
+            # sqlite3 would run the DROP INDEXes outside the transaction it
+            # opens for the INSERTs; begun here, a failed load brings them back
+            self.conn.execute("BEGIN")
+            for name in INDEXES:
+                self.conn.execute(f"DROP INDEX IF EXISTS {name}")
+            try:
+                self.conn.executemany(sql, rows())
+            except sqlite3.IntegrityError as exc:
+                raise _integrity_error(exc, current) from None
+            added = self.conn.total_changes - before
+            self._create_indexes()
+            if added:
+                # Copies added to titles already held change rows without adding any
+                self._reset()
+        if added and self._observers:
+            # Books are not kept in memory; observers get a fresh read of the new rows
+            self._notify(BOOKS_ADDED, list(self._stream("id > ?", (last_id,))))
+        return count
+
+    def remove_book(self, isbn):
+        isbn = normalize_isbn(isbn)
+        self.remove_many([isbn])
+
+    # Remove many titles in one transaction; returns the number removed
+    def remove_many(self, isbns):
+        removed = {}  # ISBN -> row
+        with self.lock, self.conn:
+            for isbn in isbns:
+                row = self._row(isbn_key(isbn))
+                if row is not None and row[3] not in removed:
+                    removed[row[3]] = row
+            self.conn.executemany("DELETE FROM books WHERE id = ?", ((row[0],) for row in removed.values()))
+            if removed:
+                self._record((row, None) for row in removed.values())
+        if self._observers:
+            self._notify(BOOKS_REMOVED, [_row_to_book(row) for row in removed.values()])
+        return len(removed)
+
+    def find_books(self, isbn):
+        return list(self._stream("isbn = ?", (normalize_isbn(isbn),)))
+
+    def lend_book(self, isbn):
+        isbn = normalize_isbn(isbn)
+        with self.lock, self.conn:
+            change, _ = self._set_lent(isbn, True)
+            if change is not None:
+                self._record([change])
+        if change is None:
+            raise BookNotAvailableError("Book is either not available or already lent.")
+        book = _row_to_book(change[1])
+        self._notify(BOOKS_LENT, [book])
+        return book
+
+    def return_book(self, isbn):
+        isbn = normalize_isbn(isbn)
+        with self.lock, self.conn:
+            change, _ = self._set_lent(isbn, False)
+            if change is not None:
+                self._record([change])
+        if change is None:
+            raise BookNotAvailableError("This book was not lent out.")
+        book = _row_to_book(change[1])
+        self._notify(BOOKS_RETURNED, [book])
+        return book
+
+    # Batch circulation in a single transaction; see Library.lend_many
+    def lend_many(self, isbns):
+        return self._circulate_many(isbns, True, BOOKS_LENT)
+
+    def return_many(self, isbns):
+        return self._circulate_many(isbns, False, BOOKS_RETURNED)
+
+    def _circulate_many(self, isbns, lent, event):
+        report = []
+        changes = []
+        with self.lock, self.conn:
+            for isbn in isbns:
+                change, result = self._set_lent(isbn_key(isbn), lent)
+                report.append((isbn, result))
+                if change is not None:
+                    changes.append(change)
+            if changes:
+                self._record(changes)
+        self._notify(event, [_row_to_book(new) for _, new in changes])
+        return report
+
+    # Lend (or return) one copy of isbn; returns ((row before, row after) or
+    # None, RESULT_*)
+    def _set_lent(self, isbn, lent):
+        row = self._row(isbn)
+        if row is None:
+            return None, RESULT_UNKNOWN
+        lent_copies, copies = row[5], row[4]
+        if lent and lent_copies >= copies:
+            return None, RESULT_ALREADY_LENT
+        if not lent and not lent_copies:
+            return None, RESULT_NOT_LENT
+        step = 1 if lent else -1
+        self.conn.execute("UPDATE books SET lent_copies = lent_copies + ? WHERE id = ?", (step, row[0]))
+        return (row, row[:5] + (lent_copies + step,) + row[6:]), RESULT_OK
+
+    def _row(self, isbn):
+        return self.conn.execute(f"SELECT {COLUMNS} FROM books WHERE isbn = ?", (isbn,)).fetchone()
+
+    def __iter__(self):
+        # Custom iterator to yield only available books
+        return self._stream(AVAILABLE)
+
+    def lent_books(self):
+        return self._stream(LENT)
+
+    def __len__(self):
+        return self._count(None)
+
+    def available_count(self):
+        return self._count("available")
+
+    def lent_count(self):
+        return self._count("lent")
+
+    # Rows of a status; counted once, then kept up to date by _record()
+    def _count(self, status):
+        with self.lock:
+            if self._counts is None:
+                self._counts = {
+                    key: self.conn.execute(f"SELECT COUNT(*) FROM books WHERE {where}").fetchone()[0]
+                    for key, where in STATUS_WHERE.items()
+                }
+            return self._counts[status]
+
+    # Ranked title/author search, see search.SearchIndex. Terms of three or
+    # more characters go through the trigram index (ordered by FTS rank);
+    # shorter ones, or every term without FTS5, filter on word prefixes.
+    # A query of short terms only is answered in title order by _search_words.
+    def search(self, query, limit=20, offset=0):
+        terms = normalize_text(query).split()
+        if not terms:
+            return []
+        fts_terms = [term for term in terms if len(term) >= TRIGRAM] if self.has_fts else []
+        prefix_terms = [term for term in terms if term not in fts_terms]
+        if not fts_terms:
+            books = self._search_words(prefix_terms, limit + offset)
+            if books is not None:
+                return books[offset:]
+        where = ["(' ' || fold(b.title) || ' ' || b.author_key) LIKE ? ESCAPE '\\'"] * len(prefix_terms)
+        params = ["% " + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                  for term in prefix_terms]
+        if fts_terms:
+            sql = f"SELECT {_prefixed('b')} FROM books_fts JOIN books b ON b.id = books_fts.rowid WHERE books_fts MATCH ?"
+            params.insert(0, " AND ".join('"' + term.replace('"', '""') + '"' for term in fts_terms))
+            order = "books_fts.rank, b.title"
+        else:
+            sql = f"SELECT {_prefixed('b')} FROM books b WHERE 1"
+            order = "b.title"
+        sql += "".join(" AND " + clause for clause in where)
+        rows = self._query(f"{sql} ORDER BY {order} LIMIT ? OFFSET ?", (*params, limit, offset))
+        return [_row_to_book(row) for row in rows]
+
+    # The first `wanted` books in title order whose title or author has a
+    # word starting with each term. Short terms match many books, so the
+    # title index is walked, SEARCH_WALK rows at a time, until enough are
+    # found; that costs O(wanted / share of books matching). Terms too rare
+    # to fill the page that way are looked up in the word index, and the
+    # few books found are sorted. Returns None if neither is possible (no
+    # FTS5, or terms without a letter or digit), for a scan instead.
+    def _search_words(self, terms, wanted):
+        needles = [" " + term for term in terms]
+        names, values = _keyset(ORDER_COLUMNS["title"])
+        found = []
+        after = None
+        for size in SEARCH_WALK:
+            where, params = ("1", ()) if after is None else (f"({names}) > ({values})", after)
+            rows = self._query(f"SELECT {COLUMNS}, author_key FROM books WHERE {where} "
+                               f"ORDER BY {', '.join(ORDER_COLUMNS['title'])} LIMIT ?", (*params, size))
+            found += [row[:-1] for row in rows if _words_match(row, needles)]
+            if len(found) >= wanted or len(rows) < size:
+                return [_row_to_book(row) for row in found[:wanted]]
+            after = (rows[-1][1], rows[-1][3])
+        words = [term for term in terms if any(char.isalnum() for char in term)]
+        if not self.has_words or not words:
+            return None
+        match = " AND ".join('"' + term.replace('"', '""') + '"*' for term in words)
+        rows = self._query(f"SELECT {_prefixed('b')}, b.author_key FROM books_words "
+                           f"JOIN books b ON b.id = books_words.rowid WHERE books_words MATCH ?", (match,))
+        # The word index splits on punctuation too; keep what the walk would
+        rows = sorted((row[:-1] for row in rows if _words_match(row, needles)), key=ROW_KEYS["title"])
+        return [_row_to_book(row) for row in rows[:wanted]]
+
+    # See Library.query. Pages are read by keyset (WHERE the sort columns
+    # are past the cursor's ORDER BY ... LIMIT) along the matching index.
+    # Titles are ordered case-insensitively for ASCII only (NOCASE).
+    def query(self, filter=None, order_by="title", limit=50, cursor=None, start=None, stop=None):
+        where = [self._status_where(filter)]
+        columns = self._order_columns(order_by)
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, not {limit!r}")
+        names, values = _keyset(columns)
+        first, first_value = _keyset(columns[:1])
+        params = []
+        if cursor is not None:
+            key = decode_cursor(cursor, order_by)
+            if len(key) != len(columns):
+                raise ValueError(f"Invalid cursor {cursor!r}")
+            where.append(f"({names}) > ({values})")
+            params += key
+        elif start is not None:
+            where.append(f"{first} >= {first_value}")
+            params.append(_bound(order_by, start))
+        if stop is not None:
+            where.append(f"{first} < {first_value}")
+            params.append(_bound(order_by, stop))
+        rows = self._query(
+            f"SELECT {COLUMNS} FROM books WHERE {' AND '.join(where)} ORDER BY {', '.join(columns)} LIMIT ?",
+            (*params, limit + 1),
+        )
+        books = [_row_to_book(row) for row in rows[:limit]]
+        if len(rows) <= limit:
+            return books, None
+        last = books[-1]
+        key = {"title": (last.title, last.isbn), "author": (normalize_author(last.author), last.title, last.isbn),
+               "isbn": (last.isbn,)}[order_by]
+        return books, encode_cursor(order_by, key)
+
+    # See Library.sorted_view, and _RowView for the cost of reading rows
+    def sorted_view(self, order_by="title", status=None):
+        self._status_where(status)
+        self._order_columns(order_by)
+        return _RowView(self, status, order_by)
+
+    def _status_where(self, status):
+        where = STATUS_WHERE.get(status)
+        if where is None:
+            raise ValueError(f"status must be None, 'available' or 'lent', not {status!r}")
+        return where
+
+    def _order_columns(self, order_by):
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"order_by must be one of {tuple(ORDER_COLUMNS)}, not {order_by!r}")
+        return ORDER_COLUMNS[order_by]
+
+    # Indexable views over the available and lent rows; see Library.available_view
+    def available_view(self):
+        return _RowView(self, "available")
+
+    def lent_view(self):
+        return _RowView(self, "lent")
+
+    def books_by_author(self, author):
+        return self._stream("author_key = ?", (normalize_author(author),))
+
+    def stream(self, status=None, chunk_size=PAGE_SIZE):
+        return self._stream(STATUS_WHERE[status], page_size=chunk_size)
+
+    # Note committed row changes, as (row before, row after) pairs with None
+    # for a row that did not exist or no longer does: bumps version, logs
+    # them for the views and updates the counts. Called under self.lock.
+    def _record(self, changes):
+        self.version += 1
+        for old, new in changes:
+            if len(self._changes) == self._changes.maxlen:
+                self._forgotten = self._changes[0][0]
+            self._changes.append((self.version, old, new))
+            if self._counts is not None:
+                for status, test in STATUS_ROWS.items():
+                    self._counts[status] += (new is not None and test(new)) - (old is not None and test(old))
+
+    # After changes too many to log (bulk loads): views and counts start over
+    def _reset(self):
+        self.version += 1
+        self._forgotten = self.version
+        self._changes.clear()
+        self._counts = None
+
+    # (version, rows of `status`, changes since `since` or None if they are
+    # no longer all logged), read together for a _RowView
+    def _view_state(self, status, since):
+        with self.lock:
+            changes = None
+            if since is not None and since >= self._forgotten:
+                changes = []
+                for version, old, new in reversed(self._changes):
+                    if version <= since:
+                        break
+                    changes.append((old, new))
+            return self.version, self._count(status), changes
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # Generator over matching rows in id order, one page per query so no
+    # cursor is held open between pages
+    def _stream(self, where, params=(), page_size=PAGE_SIZE):
+        last_id = 0
+        while True:
+            rows = self._query(
+                f"SELECT {COLUMNS} FROM books WHERE {where} AND id > ? ORDER BY id LIMIT ?",
+                (*params, last_id, page_size),
+            )
+            for row in rows:
+                yield _row_to_book(row)
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+
+
+# Range bound of query() for the leading column of an order
+def _bound(order_by, value):
+    if order_by == "isbn":
+        return "".join(str(value).split()).replace("-", "")
+    return normalize_author(value) if order_by == "author" else value
+
+
+# The column names and placeholders of a keyset comparison on ORDER BY
+# columns, as comma-separated lists. Collations go on the placeholders:
+# SQLite only searches an index for a comparison whose left side is plain
+# columns.
+# True if a row (COLUMNS plus author_key) has a word starting with each
+# needle (" " + term), in its folded title or author
+def _words_match(row, needles):
+    text = f" {normalize_text(row[1])} {row[-1]}"
+    return all(needle in text for needle in needles)
+
+
+def _keyset(columns):
+    names = [column.split()[0] for column in columns]
+    values = ["?" + column[len(name):] for name, column in zip(names, columns)]
+    return ", ".join(names), ", ".join(values)
+
+
+def _prefixed(alias):
+    return ", ".join(f"{alias}.{column}" for column in COLUMNS.split(", "))
+
+
+# Rows hold canonical ISBNs (see SqliteLibrary._migrate_isbns), so they are
+# not validated again
+def _row_to_book(row):
+    _, title, author, isbn, copies, lent_copies, download_size = row
+    return stored_book(title, author, isbn, copies, lent_copies, download_size)
+
+
+# DuplicateISBNError for a unique ISBN violation, else the error unchanged
+def _integrity_error(exc, book):
+    if "books.isbn" in str(exc):
+        return DuplicateISBNError(f"ISBN {book.isbn} is already in the catalog.")
+    return exc
+
+
+def _book_row(book, author_key):
+    size = book.download_size if isinstance(book, EBook) else None
+    return book.title, book.author, author_key, book.isbn, book.copies, book.lent_copies, size
+
+
+# Sequence over the rows of a status (None for all) in id order, or in an
+# order of ORDER_COLUMNS. Rows are read a page at a time by keyset: the view
+# remembers anchors, sort keys with the number of rows before them, and
+# seeks from the anchor (or end of the view) closest to the page, so paging
+# on from a page already read costs O(log n + PAGE_SIZE). Anchors are kept
+# through changes by replaying the library's row changes, and len() comes
+# from its maintained counts, so refreshing after a lend does not recount
+# or rescan the catalog. Only a jump far from every anchor reads past the
+# rows in between, once.
+class _RowView:
+    CACHED_PAGES = 8
+    ANCHORS = 64
+
+    def __init__(self, library, status, order_by=None):
+        self._library = library
+        self._where = STATUS_WHERE[status]
+        self._status = status
+        self._test = STATUS_ROWS[status]
+        self._key = ROW_KEYS[order_by]
+        columns = ORDER_COLUMNS[order_by] if order_by is not None else ("id",)
+        self._order = ", ".join(columns)
+        self._reverse = ", ".join(column + " DESC" for column in columns)
+        names, values = _keyset(columns)
+        self._after = f"({names}) >= ({values})"
+        self._before = f"({names}) < ({values})"
+        self._version = None
+        self._count = 0
+        self._anchors = []  # [rows before key, key]
+        self._pages = {}
+
+    def _check_version(self):
+        if self._version == self._library.version:
+            return
+        self._version, self._count, changes = self._library._view_state(self._status, self._version)
+        self._pages = {}
+        if changes is None:
+            self._anchors = []
+            return
+        # A row entering the view before an anchor moves it down one, a row leaving moves it up
+        entered = sorted(self._key(new) for old, new in changes if new is not None and self._test(new))
+        left = sorted(self._key(old) for old, new in changes if old is not None and self._test(old))
+        for anchor in self._anchors:
+            anchor[0] += bisect.bisect_left(entered, anchor[1]) - bisect.bisect_left(left, anchor[1])
+
+    def __len__(self):
+        self._check_version()
+        return self._count
+
+    def __getitem__(self, index):
+        self._check_version()
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("view index out of range")
+        number, offset = divmod(index, PAGE_SIZE)
+        page = self._pages.get(number)
+        if page is None:
+            if len(self._pages) >= self.CACHED_PAGES:
+                del self._pages[next(iter(self._pages))]
+            page = self._pages[number] = self._fetch(number * PAGE_SIZE)
+        return page[offset]
+
+    # The page of rows from position start, read from the closest anchor
+    # (or either end of the view): forward from one before the page,
+    # backward from one after it, or both ways from one inside it
+    def _fetch(self, start):
+        end = min(start + PAGE_SIZE, self._count)
+        best = (start, 0, None)  # (rows skipped, anchor position, key)
+        for position, key in [(self._count, None)] + self._anchors:
+            skip = max(start - position, position - end, 0)
+            if skip < best[0]:
+                best = (skip, position, key)
+        skip, position, key = best
+        if position <= start:
+            rows = self._read(key, True, skip, end - start)
+        else:
+            rows = self._read(key, False, skip, min(position, end) - start)[::-1]
+            if position < end:
+                rows += self._read(key, True, 0, end - position)
+        if rows and start and all(anchor[0] != start for anchor in self._anchors):
+            self._anchors.append([start, self._key(rows[0])])
+            if len(self._anchors) > self.ANCHORS:
+                del self._anchors[0]
+        return [_row_to_book(row) for row in rows]
+
+    # `limit` rows after skipping `skip`, from the row with sort key `key`
+    # on (forward) or from the one before it back (None: an end of the view)
+    def _read(self, key, forward, skip, limit):
+        where = self._where
+        if key is not None:
+            where += " AND " + (self._after if forward else self._before)
+        return self._library._query(
+            f"SELECT {COLUMNS} FROM books WHERE {where} ORDER BY {self._order if forward else self._reverse} "
+            "LIMIT ? OFFSET ?",
+            (*(key or ()), limit, skip),
+        )
@@ -0,0 +1,62 @@
+# _common.py - shared helpers for the benchmark scripts
+import itertools
+import os
+import random
+import sys
+import time
+
+# Both programs ship an identical copy of book_library.py; benchmark the PyQt one
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PYQT_program"))
+
+from book_library import Book, Library, normalize_isbn  # noqa: E402
+
+
+# A valid ISBN-13 (the 978 prefix, i, and the check digit), as Book requires
+def make_isbn(i):
+    first12 = f"978{i:09d}"
+    return first12 + str(-sum(int(digit) * (3 if k % 2 else 1) for k, digit in enumerate(first12)) % 10)
+
+
+def make_books(count):
+    return [Book(f"Title {i}", f"Author {i % 1000}", make_isbn(i)) for i in range(count)]
+
+
+# Synthetic catalog of `count` books by `authors` authors. Author k (from 1)
+# writes a share of the books proportional to 1 / k ** skew: skew 0 spreads
+# them evenly, 1 is a Zipf-like catalog where a few authors dominate.
+# Returns the books and the author names.
+def make_catalog(count, authors=1000, skew=0.0, seed=0):
+    names = [f"Author {k}" for k in range(authors)]
+    weights = list(itertools.accumulate(1 / (k + 1) ** skew for k in range(authors)))
+    rng = random.Random(seed)
+    picks = rng.choices(names, cum_weights=weights, k=count)
+    return [Book(f"Title {i}", picks[i], make_isbn(i)) for i in range(count)], names
+
+
+def make_library(count):
+    library = Library()
+    for book in make_books(count):
+        library.add_book(book)
+    return library
+
+
+def parse_sizes(text):
+    # "10k,1M,5M" -> [10000, 1000000, 5000000]
+    sizes = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        scale = {"k": 1000, "m": 1000000}.get(part[-1:], 1)
+        sizes.append(int(float(part.rstrip("km")) * scale))
+    return sizes
+
+
+def time_per_call(func, args, repeat=1):
+    # Average seconds per call of func(arg) over every arg, best of `repeat` rounds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            func(arg)
+        elapsed = (time.perf_counter() - start) / len(args)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,56 @@
+# bench_bulk_load.py - CSV/JSONL import throughput into Library and SqliteLibrary
+#
+# Usage: python benchmarks/bench_bulk_load.py [--count 5M] [--sqlite]
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+from _common import make_isbn, parse_sizes
+from book_library import Library
+from catalog_io import import_csv, import_jsonl
+from sqlite_library import SqliteLibrary
+
+
+def write_files(directory, count):
+    csv_path = os.path.join(directory, "catalog.csv")
+    jsonl_path = os.path.join(directory, "catalog.jsonl")
+    with open(csv_path, "w", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["title", "author", "isbn", "download_size"])
+        for i in range(count):
+            writer.writerow([f"Title {i}", f"Author {i % 1000}", make_isbn(i), i % 50 if i % 10 == 0 else ""])
+    with open(jsonl_path, "w", encoding="utf-8") as out:
+        for i in range(count):
+            out.write(json.dumps({"title": f"Title {i}", "author": f"Author {i % 1000}", "isbn": make_isbn(i)}) + "\n")
+    return csv_path, jsonl_path
+
+
+def run(name, load):
+    start = time.perf_counter()
+    added = load()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {added:>10} books {elapsed:>8.2f} s {added / elapsed:>12.0f} books/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV/JSONL bulk import throughput")
+    parser.add_argument("--count", default="5M")
+    parser.add_argument("--sqlite", action="store_true", help="also load into a SqliteLibrary")
+    args = parser.parse_args()
+    count = parse_sizes(args.count)[0]
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path, jsonl_path = write_files(directory, count)
+        run("Library <- CSV", lambda: import_csv(Library(), csv_path))
+        run("Library <- JSONL", lambda: import_jsonl(Library(), jsonl_path))
+        if args.sqlite:
+            db = SqliteLibrary(os.path.join(directory, "catalog.db"))
+            run("SqliteLibrary <- CSV", lambda: import_csv(db, csv_path))
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
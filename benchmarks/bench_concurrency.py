@@ -0,0 +1,111 @@
+# bench_concurrency.py - lend/return throughput of one shared Library vs thread count
+#
+# Usage: python benchmarks/bench_concurrency.py [--books 100k] [--threads 1,2,4,8]
+#                                               [--ops 20000] [--think-us 200]
+#
+# Each thread plays a desk worker: it lends a random ISBN, returns it and
+# spends --think-us microseconds on other work (sleeping, like waiting on a
+# patron or the network) outside the library. The pure-Python work inside
+# the library holds the GIL, so with --think-us 0 throughput stays flat as
+# threads are added; the locks only keep that flat line correct. Throughput
+# scales when the workers spend time outside it. A race check runs first.
+import argparse
+import random
+import threading
+import time
+
+from _common import make_isbn, make_library, parse_sizes
+from book_library import BookNotAvailableError  # noqa: E402 (path set up by _common)
+
+
+# Many threads try to lend the same copy at once; exactly one may succeed
+def race_check(library, threads, rounds=200):
+    for round_number in range(rounds):
+        isbn = make_isbn(round_number)
+        wins = []
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            barrier.wait()
+            try:
+                library.lend_book(isbn)
+                wins.append(isbn)
+            except BookNotAvailableError:
+                pass
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        if len(wins) != 1:
+            raise AssertionError(f"{len(wins)} threads lent the single copy of {isbn}")
+        library.return_book(isbn)
+
+
+def run(library, size, threads, ops, think):
+    per_thread = ops // threads
+    barrier = threading.Barrier(threads + 1)
+    errors = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        isbns = [make_isbn(rng.randrange(size)) for _ in range(per_thread)]
+        barrier.wait()
+        for isbn in isbns:
+            try:
+                library.lend_book(isbn)
+                library.return_book(isbn)
+            except BookNotAvailableError:
+                pass  # another desk has this copy right now
+            except Exception as error:
+                errors.append(error)
+                return
+            if think:
+                time.sleep(think)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lend/return throughput of a shared Library by thread count")
+    parser.add_argument("--books", default="100k")
+    parser.add_argument("--threads", default="1,2,4,8")
+    parser.add_argument("--ops", type=int, default=20000, help="lend+return pairs per run, split over the threads")
+    parser.add_argument("--think-us", type=float, default=200, help="time each worker spends outside the library per op")
+    args = parser.parse_args()
+
+    size = parse_sizes(args.books)[0]
+    thread_counts = parse_sizes(args.threads)
+    library = make_library(size)
+
+    race_check(library, max(thread_counts))
+    print(f"race check: one winner per copy with {max(thread_counts)} threads")
+    lent = library.lent_count()
+    if lent:
+        raise AssertionError(f"{lent} books left lent after the race check")
+
+    for think in (0, args.think_us / 1e6):
+        print(f"\nthink time {think * 1e6:.0f} us")
+        print(f"{'threads':>8} {'ops/s':>12} {'scaling':>8}")
+        base = None
+        for threads in thread_counts:
+            rate = run(library, size, threads, args.ops, think)
+            base = base or rate
+            print(f"{threads:>8} {rate:>12.0f} {rate / base:>7.2f}x")
+        if library.lent_count() or library.available_count() != size:
+            raise AssertionError("lent/available sets out of step after the run")
+
+
+if __name__ == "__main__":
+    main()
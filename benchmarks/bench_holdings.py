@@ -0,0 +1,152 @@
+# bench_holdings.py - one Book per copy vs one holding per title
+#
+# Usage: python benchmarks/bench_holdings.py [--titles 10k] [--copies 1,10,40]
+#
+# The per-copy baseline is the model before holdings: every copy is its own
+# object and lending scans an ISBN's copies for one that isn't lent. It is
+# compared with the holdings model in the same bare form (an ISBN dict, no
+# locks, views or events) and with the shipped Library, which keeps
+# holdings but also pays for its locks, indexes, log and events.
+# Reported are the memory of the catalog, the time to lend every copy and
+# return them all, and the time to list the available titles. The first
+# ratio row is what the data model alone gains; the second is what the
+# shipped Library gains over the per-copy model (below 1x means it is
+# slower), so the model gain should not be read as the Library's.
+import argparse
+import gc
+import time
+import tracemalloc
+
+from _common import make_isbn, parse_sizes
+from book_library import Book, BookNotAvailableError, Library  # noqa: E402 (path set up by _common)
+
+
+# One object per copy, as books were before holdings
+class CopyBook:
+    __slots__ = ("title", "author", "isbn", "is_lent")
+
+    def __init__(self, title, author, isbn):
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.is_lent = False
+
+
+# The per-copy catalog: ISBN -> list of copies
+class CopyCatalog:
+    def __init__(self):
+        self.by_isbn = {}
+
+    def add_book(self, book):
+        self.by_isbn.setdefault(book.isbn, []).append(book)
+
+    def lend_book(self, isbn):
+        for book in self.by_isbn[isbn]:
+            if not book.is_lent:
+                book.is_lent = True
+                return book
+        raise BookNotAvailableError(isbn)
+
+    def return_book(self, isbn):
+        for book in self.by_isbn[isbn]:
+            if book.is_lent:
+                book.is_lent = False
+                return book
+        raise BookNotAvailableError(isbn)
+
+    def available(self):
+        # Titles with a copy on the shelf, found by expanding the copies
+        return [copies[0] for copies in self.by_isbn.values() if any(not book.is_lent for book in copies)]
+
+
+# The holdings model in the same bare form: ISBN -> Book with copy counts
+class HoldingCatalog:
+    def __init__(self):
+        self.by_isbn = {}
+
+    def add_book(self, book):
+        self.by_isbn[book.isbn] = book
+
+    def lend_book(self, isbn):
+        book = self.by_isbn[isbn]
+        if book.lent_copies >= book.copies:
+            raise BookNotAvailableError(isbn)
+        book.lent_copies += 1
+        return book
+
+    def return_book(self, isbn):
+        book = self.by_isbn[isbn]
+        if not book.lent_copies:
+            raise BookNotAvailableError(isbn)
+        book.lent_copies -= 1
+        return book
+
+    def available(self):
+        return [book for book in self.by_isbn.values() if book.lent_copies < book.copies]
+
+
+def build_copies(titles, copies):
+    catalog = CopyCatalog()
+    for i in range(titles):
+        title, author, isbn = f"Title {i}", f"Author {i % 1000}", make_isbn(i)
+        for _ in range(copies):
+            catalog.add_book(CopyBook(title, author, isbn))
+    return catalog
+
+
+def build_holdings(titles, copies):
+    catalog = HoldingCatalog()
+    for i in range(titles):
+        catalog.add_book(Book(f"Title {i}", f"Author {i % 1000}", make_isbn(i), copies))
+    return catalog
+
+
+def build_library(titles, copies):
+    library = Library()
+    library.bulk_load(Book(f"Title {i}", f"Author {i % 1000}", make_isbn(i), copies) for i in range(titles))
+    return library
+
+
+def measure(build, titles, copies):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    catalog = build(titles, copies)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    isbns = [make_isbn(i) for i in range(titles)]
+    start = time.perf_counter()
+    for _ in range(copies):
+        for isbn in isbns:
+            catalog.lend_book(isbn)
+    for _ in range(copies):
+        for isbn in isbns:
+            catalog.return_book(isbn)
+    circulation = time.perf_counter() - start
+    start = time.perf_counter()
+    listing = list(catalog) if isinstance(catalog, Library) else catalog.available()
+    listing = time.perf_counter() - start
+    return memory, circulation, listing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-copy books vs holdings")
+    parser.add_argument("--titles", default="10k")
+    parser.add_argument("--copies", default="1,10,40")
+    args = parser.parse_args()
+    titles = parse_sizes(args.titles)[0]
+
+    print(f"{'copies':>7} {'model':>9} {'memory MB':>10} {'lend+return all':>16} {'list available':>15}")
+    for copies in parse_sizes(args.copies):
+        results = {}
+        for name, build in (("per-copy", build_copies), ("holdings", build_holdings), ("Library", build_library)):
+            results[name] = memory, circulation, listing = measure(build, titles, copies)
+            print(f"{copies:>7} {name:>9} {memory / 1e6:>10.1f} {circulation:>14.3f} s {listing * 1e3:>12.1f} ms")
+        for model in ("holdings", "Library"):
+            ratios = [old / new for old, new in zip(results["per-copy"], results[model])]
+            print(f"{'':>7} {'gain':>9} {ratios[0]:>9.2f}x {ratios[1]:>15.2f}x {ratios[2]:>14.2f}x"
+                  f"  (per-copy / {model})")
+
+
+if __name__ == "__main__":
+    main()
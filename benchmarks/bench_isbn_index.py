@@ -0,0 +1,47 @@
+# bench_isbn_index.py - linear scan vs ISBN index for lend/return lookups
+#
+# Usage: python benchmarks/bench_isbn_index.py [--sizes 10k,1M,5M] [--lookups 200]
+import argparse
+import random
+
+from _common import make_isbn, make_library, parse_sizes, time_per_call
+
+
+# The pre-index lookup, kept here as the baseline
+def scan_lend(library, isbn):
+    for book in library.books:
+        if book.isbn == isbn and not book.is_lent:
+            book.is_lent = True
+            return book
+    raise LookupError(isbn)
+
+
+def scan_return(library, isbn):
+    for book in library.books:
+        if book.isbn == isbn and book.is_lent:
+            book.is_lent = False
+            return
+    raise LookupError(isbn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Linear scan vs ISBN index for lend/return")
+    parser.add_argument("--sizes", default="10k,1M,5M")
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'books':>10} {'scan lend+return':>18} {'indexed lend+return':>20} {'speedup':>9}")
+    for size in parse_sizes(args.sizes):
+        library = make_library(size)
+        isbns = [make_isbn(random.randrange(size)) for _ in range(args.lookups)]
+
+        # Scans are O(n), so cap them to keep the 5M run bearable
+        scan_isbns = isbns[:max(1, min(len(isbns), 2000000 // size))]
+        scan = time_per_call(lambda isbn: (scan_lend(library, isbn), scan_return(library, isbn)), scan_isbns)
+        indexed = time_per_call(lambda isbn: (library.lend_book(isbn), library.return_book(isbn)), isbns, repeat=3)
+        print(f"{size:>10} {scan * 1e6:>15.1f} us {indexed * 1e6:>17.2f} us {scan / indexed:>8.0f}x")
+        del library
+
+
+if __name__ == "__main__":
+    main()
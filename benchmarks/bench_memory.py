@@ -0,0 +1,55 @@
+# bench_memory.py - bytes per book, measured with tracemalloc
+#
+# Usage: python benchmarks/bench_memory.py [--count 200k]
+import argparse
+import gc
+import tracemalloc
+
+from _common import Book, make_isbn, make_library, normalize_isbn, parse_sizes
+
+
+# Book as it was before __slots__, kept here as the baseline
+class DictBook:
+    def __init__(self, title, author, isbn):
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.is_lent = False
+
+
+def measure(build, count):
+    normalize_isbn.cache_clear()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build(count)
+    # The ISBN cache is a fixed cost shared by all books, not per-book memory
+    normalize_isbn.cache_clear()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return (after - before) / count
+
+
+def build_books(cls):
+    # Fresh strings per book, as a feed import would produce them
+    return lambda count: [cls(f"Title {i}", "".join(["Author ", str(i % 1000)]), make_isbn(i)) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per book, measured with tracemalloc")
+    parser.add_argument("--count", default="200k")
+    args = parser.parse_args()
+    count = parse_sizes(args.count)[0]
+
+    rows = [
+        ("Book with __dict__ (before)", measure(build_books(DictBook), count)),
+        ("Book with __slots__ (after)", measure(build_books(Book), count)),
+        ("Library incl. indexes (after)", measure(make_library, count)),
+    ]
+    for name, per_book in rows:
+        print(f"{name:<32} {per_book:>8.1f} bytes/book")
+
+
+if __name__ == "__main__":
+    main()
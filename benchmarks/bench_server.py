@@ -0,0 +1,133 @@
+# bench_server.py - load generator for library_server.py
+#
+# Usage: python benchmarks/bench_server.py [--books 100k] [--clients 1,4,16]
+#                                          [--requests 20000] [--batch 100] [--url URL]
+#
+# Starts a server with an in-memory catalog in a subprocess (or uses --url),
+# loads --books books through POST /books/bulk, then has --clients desks,
+# each with one keep-alive connection, send lend and return requests for
+# random ISBNs. Reported are requests/s and the latency percentiles of a
+# single request, then the same books circulated through the batch endpoints.
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from _common import make_books, make_isbn, parse_sizes
+from book_library import BookNotAvailableError  # noqa: E402 (path set up by _common)
+from library_server import RemoteLibrary  # noqa: E402
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PYQT_program", "library_server.py")
+
+
+def start_server():
+    process = subprocess.Popen([sys.executable, SERVER, "--memory", "--port", "0"],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Serving library on "):
+        process.kill()
+        raise RuntimeError(f"Server did not start: {line!r}")
+    return process, line.split()[-1]
+
+
+# Run `clients` threads that each call work(library, rng) `count` times;
+# returns (requests per second, sorted per-call latencies)
+def drive(url, clients, count, work):
+    barrier = threading.Barrier(clients + 1)
+    latencies = []
+    errors = []
+
+    def desk(seed):
+        library = RemoteLibrary(url)
+        rng = random.Random(seed)
+        mine = []
+        try:
+            barrier.wait()
+            for _ in range(count):
+                start = time.perf_counter()
+                work(library, rng)
+                mine.append(time.perf_counter() - start)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            library.close()
+            latencies.extend(mine)
+
+    desks = [threading.Thread(target=desk, args=(seed,)) for seed in range(clients)]
+    for thread in desks:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in desks:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    latencies.sort()
+    return len(latencies) / elapsed, latencies
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the library server")
+    parser.add_argument("--books", default="100k")
+    parser.add_argument("--clients", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=20000, help="requests per run, split over the clients")
+    parser.add_argument("--batch", type=int, default=100, help="ISBNs per lend_many/return_many request")
+    parser.add_argument("--url", help="use a running server; it should hold --books books")
+    args = parser.parse_args()
+
+    size = parse_sizes(args.books)[0]
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server()
+    try:
+        if process is not None:
+            start = time.perf_counter()
+            RemoteLibrary(url).bulk_load(make_books(size))
+            print(f"loaded {size} books in {time.perf_counter() - start:.1f} s")
+
+        def lend_or_return(library, rng):
+            isbn = make_isbn(rng.randrange(size))
+            try:
+                library.lend_book(isbn)
+            except BookNotAvailableError:
+                try:
+                    library.return_book(isbn)
+                except BookNotAvailableError:
+                    pass  # another desk returned it first
+
+        def batch(library, rng):
+            isbns = [make_isbn(rng.randrange(size)) for _ in range(args.batch)]
+            library.lend_many(isbns)
+            library.return_many(isbns)
+
+        print("\nsingle requests (lend, or return if lent)")
+        print(f"{'clients':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        for clients in parse_sizes(args.clients):
+            rate, latencies = drive(url, clients, args.requests // clients, lend_or_return)
+            print(f"{clients:>8} {rate:>10.0f} {percentile(latencies, 0.5) * 1e3:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1e3:>8.2f}")
+
+        print(f"\nbatches of {args.batch} (lend_many + return_many)")
+        print(f"{'clients':>8} {'books/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        for clients in parse_sizes(args.clients):
+            count = max(1, args.requests // (clients * args.batch))
+            rate, latencies = drive(url, clients, count, batch)
+            print(f"{clients:>8} {rate * 2 * args.batch:>10.0f} {percentile(latencies, 0.5) * 1e3:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1e3:>8.2f}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# bench_suite.py - timings of the Library operations across catalog sizes, as JSON
+#
+# Usage: python benchmarks/bench_suite.py [--sizes 10k,100k,1M] [--authors 1000]
+#                                         [--skew 1.0] [--backend memory|sqlite]
+#                                         [--only lend_book,...] [--output FILE]
+#                                         [--compare BASELINE.json]
+#
+# For every size a synthetic catalog is built (see _common.make_catalog) and
+# each registered benchmark times one operation on it. Operations run until
+# --ops calls or --budget seconds, whichever comes first, so O(n) operations
+# stay bearable on big catalogs. The results are written as JSON; with
+# --compare, the ratio to a previous run's results is printed to stderr.
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from _common import make_catalog, make_isbn, parse_sizes
+from book_library import Book, Library  # noqa: E402 (path set up by _common)
+from sqlite_library import SqliteLibrary  # noqa: E402
+
+# name -> function(context) returning (calls, seconds, extra fields)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+# Everything a benchmark needs about the catalog under test
+class Context:
+    def __init__(self, library, size, authors, skew, ops, budget, seed):
+        self.library = library
+        self.size = size
+        self.authors = authors
+        self.skew = skew
+        self.ops = ops
+        self.budget = budget
+        self.rng = random.Random(seed)
+        self.next_isbn = size  # first ISBN not in the catalog
+
+    def isbns(self):
+        return [make_isbn(self.rng.randrange(self.size)) for _ in range(self.ops)]
+
+    def new_books(self):
+        start = self.next_isbn
+        self.next_isbn += self.ops
+        return [Book(f"Title {i}", f"Author {i % len(self.authors)}", make_isbn(i)) for i in range(start, self.next_isbn)]
+
+
+# Call func(arg) for each arg until they run out or the budget is spent
+def timed(func, args, budget):
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    for arg in args:
+        func(arg)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            break
+    return calls, elapsed
+
+
+@benchmark("add_book")
+def bench_add_book(context):
+    return timed(context.library.add_book, context.new_books(), context.budget) + ({},)
+
+
+@benchmark("lend_book")
+def bench_lend_book(context):
+    # Distinct ISBNs, so every call finds a copy on the shelf
+    isbns = list({isbn: None for isbn in context.isbns()})
+    result = timed(context.library.lend_book, isbns, context.budget)
+    context.lent = isbns[:result[0]]
+    return result + ({},)
+
+
+@benchmark("return_book")
+def bench_return_book(context):
+    lent = getattr(context, "lent", None)
+    if lent is None:
+        lent = list({isbn: None for isbn in context.isbns()})
+        context.library.lend_many(lent)
+    result = timed(context.library.return_book, lent, context.budget)
+    context.library.return_many(lent[result[0]:])  # leave the catalog as it was
+    context.lent = None
+    return result + ({},)
+
+
+@benchmark("iter")
+def bench_iter(context):
+    # One call is a full pass over the available books
+    count = 0
+
+    def full_pass(_):
+        nonlocal count
+        count = sum(1 for _ in context.library)
+
+    calls, seconds = timed(full_pass, range(max(1, context.ops // 100)), context.budget)
+    return calls, seconds, {"books_per_call": count}
+
+
+@benchmark("books_by_author")
+def bench_books_by_author(context):
+    # Authors drawn with the catalog's own skew, so popular ones come up more
+    weights = [1 / (k + 1) ** context.skew for k in range(len(context.authors))]
+    authors = context.rng.choices(context.authors, weights=weights, k=context.ops)
+    found = 0
+
+    def lookup(author):
+        nonlocal found
+        found += sum(1 for _ in context.library.books_by_author(author))
+
+    calls, seconds = timed(lookup, authors, context.budget)
+    return calls, seconds, {"mean_results": found / calls if calls else 0}
+
+
+@benchmark("query")
+def bench_query(context):
+    # Walk the catalog in title order, one page of 50 per call; the first
+    # call also builds the sorted index and is reported on its own
+    start = time.perf_counter()
+    _, cursor = context.library.query(order_by="title", limit=50)
+    first = time.perf_counter() - start
+
+    def next_page(_):
+        nonlocal cursor
+        _, cursor = context.library.query(order_by="title", limit=50, cursor=cursor)
+
+    calls, seconds = timed(next_page, range(min(context.ops, context.size // 50 - 1)), context.budget)
+    return calls, seconds, {"first_call_seconds": first}
+
+
+@benchmark("lend_sorted")
+def bench_lend_sorted(context):
+    # lend_book while the GUI shows the available and lent books by title,
+    # so both sorted views follow every lend
+    context.library.sorted_view("title", "available")
+    context.library.sorted_view("title", "lent")
+    isbns = list({isbn: None for isbn in context.isbns()})
+    result = timed(context.library.lend_book, isbns, context.budget)
+    context.library.return_many(isbns[:result[0]])
+    return result + ({},)
+
+
+@benchmark("upsert_book")
+def bench_upsert_book(context):
+    # Re-import rows the catalog already holds, under a new title, as a
+    # feed update would; each call replaces one holding
+    books = [Book(f"Revised {isbn}", "Revised author", isbn) for isbn in dict.fromkeys(context.isbns())]
+    return timed(context.library.upsert_book, books, context.budget) + ({},)
+
+
+@benchmark("remove_book")
+def bench_remove_book(context):
+    # Near the end, as it shrinks the catalog
+    isbns = list({isbn: None for isbn in context.isbns()})
+    return timed(context.library.remove_book, isbns, context.budget) + ({},)
+
+
+@benchmark("remove_many")
+def bench_remove_many(context):
+    # One call removes --ops titles; ISBNs already gone are skipped
+    isbns = list({isbn: None for isbn in context.isbns()})
+    removed = 0
+
+    def remove(batch):
+        nonlocal removed
+        removed += context.library.remove_many(batch)
+
+    calls, seconds = timed(remove, [isbns], context.budget)
+    return calls, seconds, {"removed": removed}
+
+
+def open_backend(backend, directory, size):
+    if backend == "sqlite":
+        return SqliteLibrary(os.path.join(directory, f"bench_{size}.db"))
+    return Library()
+
+
+def run(args):
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks: {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in parse_sizes(args.sizes):
+            books, authors = make_catalog(size, args.authors, args.skew, args.seed)
+            library = open_backend(args.backend, directory, size)
+            start = time.perf_counter()
+            library.bulk_load(books)
+            print(f"size {size}: catalog built in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+            del books
+            context = Context(library, size, authors, args.skew, args.ops, args.budget, args.seed)
+            for name in names:
+                calls, seconds, extra = BENCHMARKS[name](context)
+                per_call = seconds / calls if calls else None
+                results.append({"op": name, "size": size, "calls": calls, "seconds": seconds,
+                                "seconds_per_call": per_call, **extra})
+                print(f"  {name:<16} {calls:>7} calls {per_call * 1e6 if per_call else 0:>12.2f} us/call",
+                      file=sys.stderr)
+            library.close()
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "authors": args.authors,
+            "skew": args.skew,
+            "ops": args.ops,
+            "budget": args.budget,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+# Print current / baseline time per call for every (op, size) both runs have
+def compare(report, path):
+    with open(path, encoding="utf-8") as f:
+        baseline = {(row["op"], row["size"]): row for row in json.load(f)["results"]}
+    print(f"\n{'op':<16} {'size':>9} {'baseline us':>12} {'now us':>10} {'ratio':>7}", file=sys.stderr)
+    for row in report["results"]:
+        old = baseline.get((row["op"], row["size"]))
+        if old is None or not old["seconds_per_call"] or not row["seconds_per_call"]:
+            continue
+        ratio = row["seconds_per_call"] / old["seconds_per_call"]
+        print(f"{row['op']:<16} {row['size']:>9} {old['seconds_per_call'] * 1e6:>12.2f} "
+              f"{row['seconds_per_call'] * 1e6:>10.2f} {ratio:>6.2f}x", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Library operations across catalog sizes; writes JSON")
+    parser.add_argument("--sizes", default="10k,100k,1M")
+    parser.add_argument("--authors", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=1.0, help="author popularity exponent, 0 for uniform")
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--only", help="comma-separated benchmarks to run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--ops", type=int, default=1000, help="most calls per benchmark")
+    parser.add_argument("--budget", type=float, default=2.0, help="most seconds per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--compare", help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+# _common.py - shared helpers for the tests
+import os
+import sys
+
+# Both programs ship identical copies of the library modules; test the
+# tkinter one, which also holds the GUI's VirtualListbox
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tkinter_program"))
+
+
+# A valid ISBN-13 (the 978 prefix, i, and the check digit), as Book requires
+def make_isbn(i):
+    first12 = f"978{i:09d}"
+    return first12 + str(-sum(int(digit) * (3 if k % 2 else 1) for k, digit in enumerate(first12)) % 10)
@@ -0,0 +1,52 @@
+# test_bulk_load.py - bulk_load() when the input fails partway
+#
+# read_csv() raises on a bad row after yielding the good ones before it.
+# Library keeps the books read so far, consistently indexed; SqliteLibrary
+# rolls the whole load back, its secondary indexes included.
+import pytest
+
+from _common import make_isbn
+from book_library import Book, DuplicateISBNError, InvalidISBNError, Library  # noqa: E402 (path set up by _common)
+from catalog_io import import_csv  # noqa: E402
+from sqlite_library import INDEXES, SqliteLibrary  # noqa: E402
+
+CSV = f"title,author,isbn\nFirst,Author,{make_isbn(1)}\nBad,Author,123\nLast,Author,{make_isbn(3)}\n"
+
+
+def write_csv(tmp_path):
+    path = tmp_path / "books.csv"
+    path.write_text(CSV, encoding="utf-8")
+    return str(path)
+
+
+def test_library_keeps_the_books_read_before_a_bad_row(tmp_path):
+    library = Library()
+    seen = []
+    library.subscribe(lambda event, books: seen.extend(book.isbn for book in books))
+    with pytest.raises(InvalidISBNError):
+        import_csv(library, write_csv(tmp_path))
+    assert len(library) == 1
+    assert seen == [make_isbn(1)]
+    assert [book.title for book in library.find_books(make_isbn(1))] == ["First"]
+
+    library.add_book(Book("Other", "Author", make_isbn(2)))
+    assert library.lend_book(make_isbn(1)).title == "First"
+    library.add_book(Book("First", "Author", make_isbn(1)))
+    assert [(book.title, book.copies) for book in library.find_books(make_isbn(1))] == [("First", 2)]
+    assert [book.title for book in library.sorted_view("title")] == ["First", "Other"]
+
+
+def test_sqlite_rolls_back_a_failed_load_with_its_indexes(tmp_path):
+    library = SqliteLibrary(str(tmp_path / "catalog.db"))
+    library.add_book(Book("Held", "Author", make_isbn(5)))
+
+    def indexes():
+        return {row[0] for row in library.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    with pytest.raises(InvalidISBNError):
+        import_csv(library, write_csv(tmp_path))
+    with pytest.raises(DuplicateISBNError):
+        library.bulk_load([Book("New", "Author", make_isbn(6)), Book("Again", "Author", make_isbn(5))], "reject")
+    assert set(INDEXES) <= indexes()
+    assert len(library) == 1
+    library.close()
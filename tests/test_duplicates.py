@@ -0,0 +1,95 @@
+# test_duplicates.py - the duplicates policies of add_book() and bulk_load()
+#
+# A book whose ISBN is already held, in any form, is merged into the holding
+# (its copies added), replaces it (copies on loan carry over) or is refused
+# with DuplicateISBNError, by the library's policy or the one passed in.
+# Library and SqliteLibrary must agree.
+import pytest
+
+from _common import make_isbn
+from book_library import Book, DuplicateISBNError, Library  # noqa: E402 (path set up by _common)
+from sqlite_library import SqliteLibrary  # noqa: E402
+
+ISBN13 = "9780306406157"
+ISBN10 = "0-306-40615-2"  # the same book
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_library(request, tmp_path):
+    libraries = []
+
+    def make_library(duplicates="merge"):
+        if request.param == "memory":
+            library = Library(duplicates=duplicates)
+        else:
+            library = SqliteLibrary(str(tmp_path / f"catalog{len(libraries)}.db"), duplicates=duplicates)
+        library.add_book(Book("Held", "Author", ISBN13, copies=3))
+        library.lend_book(ISBN13)
+        libraries.append(library)
+        return library
+
+    yield make_library
+    for library in libraries:
+        library.close()
+
+
+def holding(library):
+    return [(book.title, book.author, book.copies, book.lent_copies) for book in library.find_books(ISBN13)]
+
+
+def test_merge_adds_copies(make_library):
+    library = make_library()
+    library.add_book(Book("Other title", "Other", ISBN10, copies=2))
+    assert holding(library) == [("Held", "Author", 5, 1)]
+    assert len(library) == 1
+
+
+def test_replace_keeps_copies_on_loan(make_library):
+    library = make_library("replace")
+    library.add_book(Book("New", "Someone", ISBN10, copies=2))
+    assert holding(library) == [("New", "Someone", 2, 1)]
+    assert [book.isbn for book in library.books_by_author("Someone")] == [ISBN13]
+    assert list(library.books_by_author("Author")) == []
+
+
+def test_reject_raises_and_changes_nothing(make_library):
+    library = make_library("reject")
+    with pytest.raises(DuplicateISBNError):
+        library.add_book(Book("New", "Someone", ISBN10))
+    assert holding(library) == [("Held", "Author", 3, 1)]
+
+
+def test_policy_passed_in_overrides_the_librarys(make_library):
+    library = make_library("reject")
+    library.add_book(Book("Held", "Author", ISBN10), "merge")
+    assert holding(library) == [("Held", "Author", 4, 1)]
+    library.add_book(Book("New", "Someone", ISBN10), "replace")
+    assert holding(library) == [("New", "Someone", 1, 1)]
+    with pytest.raises(ValueError):
+        library.add_book(Book("New", "Someone", ISBN10), "ignore")
+
+
+def test_bulk_load_merges_repeats_within_the_load(make_library):
+    library = make_library()
+    assert library.bulk_load([Book("A", "Author", ISBN10), Book("B", "Author", make_isbn(1), copies=2),
+                              Book("C", "Author", make_isbn(1), copies=3)]) == 3
+    assert holding(library) == [("Held", "Author", 4, 1)]
+    assert [book.copies for book in library.find_books(make_isbn(1))] == [5]
+
+
+def test_bulk_load_replace_keeps_the_last_record(make_library):
+    library = make_library()
+    library.bulk_load([Book("First", "One", ISBN10, copies=2), Book("Last", "Two", ISBN13, copies=4),
+                       Book("B", "Author", make_isbn(1)), Book("B again", "Author", make_isbn(1))], "replace")
+    assert holding(library) == [("Last", "Two", 4, 1)]
+    assert [book.title for book in library.find_books(make_isbn(1))] == ["B again"]
+    assert len(library) == 2
+
+
+def test_bulk_load_reject_stops_at_the_duplicate(make_library):
+    library = make_library("reject")
+    with pytest.raises(DuplicateISBNError):
+        library.bulk_load([Book("B", "Author", make_isbn(1)), Book("New", "Someone", ISBN10),
+                           Book("C", "Author", make_isbn(2))])
+    assert holding(library) == [("Held", "Author", 3, 1)]
+    assert not library.find_books(make_isbn(2))
@@ -0,0 +1,65 @@
+# test_isbn.py - normalize_isbn(): check digits, ISBN-10 conversion, prefixes
+#
+# Every ISBN is stored as its canonical ISBN-13, so the same book typed as an
+# ISBN-10, with hyphens or with spaces must give one key, and anything whose
+# check digit fails or that is not a book number must be refused.
+import pytest
+
+from _common import make_isbn
+from book_library import InvalidISBNError, Book, is_valid_isbn, isbn_key, normalize_isbn  # noqa: E402 (path set up by _common)
+
+
+# A 13-digit number with a correct check digit but any prefix
+def with_check_digit(first12):
+    return first12 + str(-sum(int(digit) * (3 if k % 2 else 1) for k, digit in enumerate(first12)) % 10)
+
+
+@pytest.mark.parametrize("isbn", ["9780306406157", "978-0-306-40615-7", " 978 0306 40615 7 ", "0306406152",
+                                  "0-306-40615-2"])
+def test_forms_of_one_isbn_share_a_key(isbn):
+    assert normalize_isbn(isbn) == "9780306406157"
+
+
+@pytest.mark.parametrize("isbn10, isbn13", [
+    ("080442957X", "9780804429573"),
+    ("0-8044-2957-x", "9780804429573"),  # lower-case check digit
+    ("0198534531", "9780198534532"),
+])
+def test_isbn10_converts_to_isbn13(isbn10, isbn13):
+    assert normalize_isbn(isbn10) == isbn13
+    assert Book("Title", "Author", isbn10).isbn == isbn13
+
+
+@pytest.mark.parametrize("isbn", [
+    "9780306406158",  # ISBN-13 check digit off by one
+    "0306406153",  # ISBN-10 check digit off by one
+    "0804429570",  # X is the only valid check digit here
+    "X804429573",  # X only as a check digit
+    "97803064061",  # too short
+    "97803064061570",  # too long
+    "978030640615a",
+    "",
+])
+def test_bad_check_digit_or_shape_is_rejected(isbn):
+    with pytest.raises(InvalidISBNError):
+        normalize_isbn(isbn)
+    assert not is_valid_isbn(isbn)
+
+
+@pytest.mark.parametrize("prefix", ["977", "000", "123", "980"])
+def test_13_digits_without_a_book_prefix_are_rejected(prefix):
+    isbn = with_check_digit(prefix + "030640615")  # checksum fine, not a book
+    with pytest.raises(InvalidISBNError):
+        normalize_isbn(isbn)
+    assert normalize_isbn(with_check_digit("979" + "030640615")).startswith("979")
+
+
+def test_invalid_isbn_is_a_value_error():
+    with pytest.raises(ValueError):
+        Book("Title", "Author", "123")
+
+
+def test_isbn_key_leaves_invalid_isbns_alone():
+    assert isbn_key("0-306-40615-2") == "9780306406157"
+    assert isbn_key("not an isbn") == "not an isbn"
+    assert isbn_key(make_isbn(7)) == make_isbn(7)
@@ -0,0 +1,100 @@
+# test_library_server.py - LibraryServer error replies and RemoteLibrary retries
+#
+# A failing request must get a reply (400 or 500) rather than a dropped
+# connection, and RemoteLibrary must never send a request that changes the
+# catalog twice.
+import threading
+import time
+
+import pytest
+
+from _common import make_isbn
+from book_library import Book, EBook, Library  # noqa: E402 (path set up by _common)
+from library_server import LibraryRequestHandler, LibraryServer, RemoteError, RemoteLibrary  # noqa: E402
+from sqlite_library import SqliteLibrary  # noqa: E402
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(library):
+        server = LibraryServer(library, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return RemoteLibrary(f"http://127.0.0.1:{server.server_address[1]}")
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_rejected_row_is_a_bad_request(serve, tmp_path):
+    remote = serve(SqliteLibrary(str(tmp_path / "catalog.db")))
+    with pytest.raises(RemoteError, match="Bad request"):
+        remote.add_book(EBook("Title", "Author", make_isbn(1), "not a number"))
+    remote.add_book(Book("Title", "Author", make_isbn(2)))  # same connection, still served
+    assert len(remote) == 1
+
+
+def test_unexpected_error_is_answered_once(serve, monkeypatch, capsys):
+    library = Library()
+    calls = []
+
+    def add_book(book, duplicates=None):
+        calls.append(book.isbn)
+        raise RuntimeError("disk on fire")
+
+    monkeypatch.setattr(library, "add_book", add_book)
+    remote = serve(library)
+    with pytest.raises(RemoteError, match="disk on fire"):
+        remote.add_book(Book("Title", "Author", make_isbn(1)))
+    assert calls == [make_isbn(1)]
+    assert "RuntimeError" in capsys.readouterr().err
+
+
+def test_stale_connection_is_replaced_before_a_post(serve, monkeypatch):
+    monkeypatch.setattr(LibraryRequestHandler, "timeout", 0.2)
+    library = Library()
+    remote = serve(library)
+    assert len(remote) == 0
+    time.sleep(0.5)  # the server drops the idle connection
+    remote.add_book(Book("Title", "Author", make_isbn(1)))
+    assert len(library) == 1
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_stream_pages_every_book_once(serve, tmp_path, backend):
+    library = Library() if backend == "memory" else SqliteLibrary(str(tmp_path / "catalog.db"))
+    library.bulk_load([Book(f"Title {i}", "Author", make_isbn(i)) for i in range(250)])
+    remote = serve(library)
+    streamed = [book.isbn for book in remote.stream(chunk_size=40)]
+    assert streamed == sorted(make_isbn(i) for i in range(250))
+    remote.lend_book(make_isbn(7))
+    assert [book.isbn for book in remote.stream("lent", chunk_size=40)] == [make_isbn(7)]
+
+
+def test_version_counts_changes_from_every_thread():
+    library = Library()
+    library.bulk_load([Book(f"Title {i}", "Author", make_isbn(i), copies=50) for i in range(8)])
+    server = LibraryServer(library, port=0)
+    try:
+        threads = [threading.Thread(target=lambda i=i: [library.lend_book(make_isbn(i)) for _ in range(50)])
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert server.version == 400
+    finally:
+        server.server_close()
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_remove_many_skips_invalid_isbns(serve, tmp_path, backend):
+    library = Library() if backend == "memory" else SqliteLibrary(str(tmp_path / "catalog.db"))
+    library.bulk_load([Book(f"Title {i}", "Author", make_isbn(i)) for i in range(3)])
+    remote = serve(library)
+    assert remote.remove_many([make_isbn(0), "not an isbn", make_isbn(0), make_isbn(99), make_isbn(2)]) == 2
+    assert [book.isbn for book in library.stream()] == [make_isbn(1)]
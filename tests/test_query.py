@@ -0,0 +1,90 @@
+# test_query.py - query() paging by cursor and by start/stop bounds
+#
+# A cursor resumes right after the last book of its page, so a book added
+# or removed between two pages never repeats or skips one that was there
+# all along. start is included, stop is not, and both compare the way the
+# order does. Library and SqliteLibrary must agree.
+import pytest
+
+from _common import make_isbn
+from book_library import Book, Library  # noqa: E402 (path set up by _common)
+from sqlite_library import SqliteLibrary  # noqa: E402
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def library(request, tmp_path):
+    library = Library() if request.param == "memory" else SqliteLibrary(str(tmp_path / "catalog.db"))
+    library.bulk_load([Book(f"Title {i:02d}", f"{'ABCDE'[i % 5]}uthor", make_isbn(i)) for i in range(30)])
+    yield library
+    library.close()
+
+
+def titles(books):
+    return [book.title for book in books]
+
+
+def page_through(library, limit, **kwargs):
+    books, cursor = library.query(limit=limit, **kwargs)
+    pages = [books]
+    while cursor is not None:
+        books, cursor = library.query(limit=limit, cursor=cursor, **kwargs)
+        pages.append(books)
+    return pages
+
+
+def test_pages_cover_every_book_once(library):
+    pages = page_through(library, 7)
+    assert [len(page) for page in pages] == [7, 7, 7, 7, 2]
+    assert titles(book for page in pages for book in page) == [f"Title {i:02d}" for i in range(30)]
+    assert library.query(limit=30)[1] is None
+
+
+def test_cursor_survives_inserts_and_removes(library):
+    first, cursor = library.query(limit=10)
+    assert titles(first)[-1] == "Title 09"
+    library.add_book(Book("Title 05a", "Author", make_isbn(100)))  # before the cursor
+    library.add_book(Book("Title 10a", "Author", make_isbn(101)))  # after it
+    library.remove_book(make_isbn(9))  # the cursor's own book
+    library.remove_book(make_isbn(11))
+    second, cursor = library.query(limit=5, cursor=cursor)
+    assert titles(second) == ["Title 10", "Title 10a", "Title 12", "Title 13", "Title 14"]
+    assert titles(library.query(limit=1, cursor=cursor)[0]) == ["Title 15"]
+
+
+def test_filter_pages_only_that_status(library):
+    for i in (3, 17, 25):
+        library.lend_book(make_isbn(i))
+    lent, cursor = library.query(filter="lent", limit=2)
+    assert titles(lent) == ["Title 03", "Title 17"]
+    assert titles(library.query(filter="lent", limit=2, cursor=cursor)[0]) == ["Title 25"]
+    assert len(library.query(filter="available", limit=100)[0]) == 27
+
+
+def test_start_is_included_and_stop_is_not(library):
+    books, cursor = library.query(order_by="author", start="b", stop="D", limit=100)
+    assert {book.author for book in books} == {"Buthor", "Cuthor"}
+    assert len(books) == 12 and cursor is None
+    assert titles(library.query(start="Title 28", limit=100)[0]) == ["Title 28", "Title 29"]
+    assert titles(library.query(stop="Title 02", limit=100)[0]) == ["Title 00", "Title 01"]
+    assert library.query(start="Title 10", stop="Title 10", limit=100)[0] == []
+
+
+def test_bounds_hold_across_pages(library):
+    pages = page_through(library, 4, start="Title 05", stop="Title 15")
+    assert titles(book for page in pages for book in page) == [f"Title {i:02d}" for i in range(5, 15)]
+
+
+def test_isbn_bounds_accept_hyphens(library):
+    books = library.query(order_by="isbn", start=make_isbn(3), stop=make_isbn(6)[:3] + "-" + make_isbn(6)[3:],
+                          limit=100)[0]
+    assert [book.isbn for book in books] == [make_isbn(i) for i in range(3, 6)]
+
+
+def test_cursor_is_tied_to_its_order(library):
+    cursor = library.query(limit=5)[1]
+    with pytest.raises(ValueError):
+        library.query(order_by="author", cursor=cursor)
+    with pytest.raises(ValueError):
+        library.query(cursor="not a cursor")
+    with pytest.raises(ValueError):
+        library.query(limit=0)
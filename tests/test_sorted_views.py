@@ -0,0 +1,110 @@
+# test_sorted_views.py - Library.sorted_view()/query() from observers and other threads
+#
+# Observers run with the library's locks held. Reading a view that already
+# exists must work from inside one, building a new view from there must
+# fail instead of deadlocking, and a view built by another thread while a
+# lend is notified must wait for the lend and then see it.
+import threading
+
+import pytest
+
+from _common import make_isbn
+from book_library import Book, Library  # noqa: E402 (path set up by _common)
+
+TIMEOUT = 5  # seconds before a stuck thread counts as a deadlock
+
+
+def make_library(count=20):
+    library = Library()
+    library.bulk_load([Book(f"Title {i}", f"Author {i % 3}", make_isbn(i)) for i in range(count)])
+    return library
+
+
+# Run fn on a thread and fail if it doesn't finish in time
+def run(fn):
+    errors = []
+
+    def target():
+        try:
+            fn()
+        except BaseException as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "deadlocked"
+    if errors:
+        raise errors[0]
+
+
+def test_observer_reads_existing_views():
+    library = make_library()
+    library.sorted_view("title", "lent")
+    library.query(order_by="title")
+    seen = []
+
+    def observer(event, books):
+        seen.append((len(library.sorted_view("title", "lent")), len(library.query(order_by="title")[0])))
+
+    library.subscribe(observer)
+    run(lambda: library.lend_book(make_isbn(1)))
+    run(lambda: library.add_book(Book("New", "Someone", make_isbn(100))))
+    assert seen == [(1, 20), (1, 21)]
+
+
+def test_observer_cannot_build_a_view():
+    library = make_library()
+    errors = []
+
+    def observer(event, books):
+        try:
+            library.sorted_view("author")
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    library.subscribe(observer)
+    run(lambda: library.lend_book(make_isbn(1)))
+    run(lambda: library.add_book(Book("New", "Someone", make_isbn(100))))
+    assert len(errors) == 2
+    library.unsubscribe(observer)
+    assert len(library.sorted_view("author")) == 21
+
+
+def test_view_built_during_a_lend_sees_it():
+    library = make_library()
+    in_observer = threading.Event()
+    release = threading.Event()
+    views = []
+
+    def observer(event, books):
+        in_observer.set()
+        release.wait(TIMEOUT)
+
+    library.subscribe(observer)
+    lender = threading.Thread(target=library.lend_book, args=(make_isbn(1),), daemon=True)
+    lender.start()
+    assert in_observer.wait(TIMEOUT)
+    builder = threading.Thread(target=lambda: views.append(library.sorted_view("isbn", "lent")), daemon=True)
+    builder.start()
+    builder.join(0.2)
+    assert builder.is_alive()  # waits for the lend's stripe
+    release.set()
+    lender.join(TIMEOUT)
+    builder.join(TIMEOUT)
+    assert not builder.is_alive(), "deadlocked"
+    assert [book.isbn for book in views[0]] == [make_isbn(1)]
+
+
+@pytest.mark.parametrize("order_by", ["title", "author", "isbn"])
+def test_concurrent_builds_share_one_index(order_by):
+    library = make_library()
+    views = []
+    threads = [threading.Thread(target=lambda: views.append(library.sorted_view(order_by)), daemon=True)
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert len(views) == 8
+    assert all(view is views[0] for view in views)
@@ -0,0 +1,40 @@
+# test_sqlite_search.py - SqliteLibrary.search() for terms too short for the trigram index
+#
+# Such queries walk the title index until the page is full and turn to the
+# word index for rare terms; either way the result must be the first books
+# in title order that have a word starting with every term.
+import random
+
+import pytest
+
+from _common import make_isbn
+from book_library import Book, normalize_text  # noqa: E402 (path set up by _common)
+import sqlite_library  # noqa: E402
+
+SYLLABLES = ["ka", "lo", "Mi", "né", "har", "ry", "o'b", "el", "IS", "q-x", "Él"]
+
+
+def expected(library, query, limit):
+    terms = normalize_text(query).split()
+    books = [book for book in library.stream()
+             if all(" " + term in f" {normalize_text(book.title)} {normalize_text(book.author)}" for term in terms)]
+    order = sqlite_library.ROW_KEYS["title"]  # NOCASE order, as SQLite sorts titles
+    books.sort(key=lambda book: order((None, book.title, book.author, book.isbn)))
+    return [book.isbn for book in books[:limit]]
+
+
+@pytest.mark.parametrize("walk", [sqlite_library.SEARCH_WALK, (10, 20)])
+def test_short_terms_match_a_full_scan(tmp_path, monkeypatch, walk):
+    monkeypatch.setattr(sqlite_library, "SEARCH_WALK", walk)  # (10, 20) sends most queries to the word index
+    rng = random.Random(0)
+
+    def word():
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+    library = sqlite_library.SqliteLibrary(str(tmp_path / "catalog.db"))
+    library.bulk_load(Book(" ".join(word().capitalize() for _ in range(rng.randint(1, 3))),
+                           f"{word()} {word()}", make_isbn(i)) for i in range(2000))
+    for query in ["h", "ha", "zz", "q", "o'", "é", "NÉ", "is el", "ry ka", "q-"]:
+        for limit in (5, 50):
+            assert [book.isbn for book in library.search(query, limit=limit)] == expected(library, query, limit)
+    library.close()
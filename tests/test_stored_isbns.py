@@ -0,0 +1,91 @@
+# test_stored_isbns.py - catalogs saved before ISBNs were validated still open
+#
+# A stored ISBN that fails validation must not make the catalog unreadable:
+# it is set aside (the books_quarantine table, the catalog.quarantine file)
+# and the rest loads. Rows holding one ISBN in several forms end up as one
+# holding with all their copies.
+import json
+import sqlite3
+
+from _common import make_isbn
+from catalog_storage import WalStorage  # noqa: E402 (path set up by _common)
+from book_library import Library  # noqa: E402
+from sqlite_library import SCHEMA, SqliteLibrary  # noqa: E402
+
+ISBN13 = "9780306406157"
+ISBN10 = "0306406152"  # the same book
+HYPHENATED = "0-306-40615-2"
+
+
+def holdings(library):
+    return sorted((book.isbn, book.copies, book.lent_copies) for book in library.stream())
+
+
+def test_sqlite_v1_catalog_is_merged_and_quarantined(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("CREATE UNIQUE INDEX books_isbn ON books (isbn)")
+    conn.executemany(
+        "INSERT INTO books (title, author, author_key, isbn, copies, lent_copies) VALUES (?, ?, ?, ?, ?, ?)",
+        [("Title", "Author", "author", ISBN13, 2, 1),
+         ("Title", "Author", "author", ISBN10, 3, 2),  # left behind by version 1's UPDATE OR IGNORE
+         ("Other", "Author", "author", "123", 1, 0),
+         ("Title", "Author", "author", HYPHENATED, 1, 1)])
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    library = SqliteLibrary(path)
+    assert holdings(library) == [(ISBN13, 6, 4)]
+    assert (len(library), library.available_count(), library.lent_count()) == (1, 1, 1)
+    assert library.conn.execute("SELECT isbn FROM books_quarantine").fetchall() == [("123",)]
+    library.lend_book(ISBN10)
+    assert holdings(library) == [(ISBN13, 6, 5)]
+    library.close()
+
+
+def test_sqlite_per_copy_catalog_folds_isbn_forms(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT NOT NULL, author TEXT NOT NULL,
+                            author_key TEXT NOT NULL, isbn TEXT NOT NULL, is_lent INTEGER NOT NULL DEFAULT 0,
+                            download_size NUMERIC);
+        CREATE INDEX books_isbn ON books (isbn);
+    """)
+    conn.executemany("INSERT INTO books (title, author, author_key, isbn, is_lent) VALUES (?, ?, ?, ?, ?)",
+                     [("Title", "Author", "author", HYPHENATED, 1), ("Title", "Author", "author", ISBN13, 0),
+                      ("Other", "Author", "author", "bad", 0)])
+    conn.commit()
+    conn.close()
+
+    library = SqliteLibrary(path)
+    assert holdings(library) == [(ISBN13, 2, 1)]
+    assert [row[4] for row in library.conn.execute("SELECT * FROM books_quarantine")] == ["bad"]
+    library.close()
+
+
+def test_wal_catalog_quarantines_invalid_isbns(tmp_path):
+    with open(tmp_path / "catalog.snapshot", "w", encoding="utf-8") as out:
+        out.write(json.dumps({"seq": 2}) + "\n")
+        for isbn, lent in [(ISBN13, 1), ("123", 0), (make_isbn(1), 0)]:
+            out.write(json.dumps({"title": "Title", "author": "Author", "isbn": isbn,
+                                  "copies": 2, "lent_copies": lent}) + "\n")
+    with open(tmp_path / "catalog.wal", "w", encoding="utf-8") as out:
+        out.write(json.dumps({"seq": 3, "op": "add", "value": {"title": "Title", "author": "Author",
+                                                                "isbn": HYPHENATED, "copies": 1}}) + "\n")
+        out.write(json.dumps({"seq": 4, "op": "add", "value": {"title": "Bad", "author": "Author",
+                                                                "isbn": "12-3", "copies": 1}}) + "\n")
+
+    storage = WalStorage(tmp_path, durability="none")
+    library = Library(storage=storage)
+    assert sorted((book.isbn, book.copies, book.lent_copies) for book in library.books) == [
+        (make_isbn(1), 2, 0), (ISBN13, 3, 1)]
+    with open(tmp_path / "catalog.quarantine", encoding="utf-8") as quarantine:
+        assert [json.loads(line)["isbn"] for line in quarantine] == ["123", "12-3"]
+    library.close()
+
+    reopened = WalStorage(tmp_path, durability="none")
+    Library(storage=reopened).close()
+    assert reopened.quarantined == []
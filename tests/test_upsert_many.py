@@ -0,0 +1,26 @@
+# test_upsert_many.py - upsert_many() when the input fails partway
+#
+# Re-importing a CSV with upsert_many(read_csv(...)) that hits a bad row must
+# keep, log and announce the books upserted before it.
+import pytest
+
+from _common import make_isbn
+from book_library import InvalidISBNError, Library  # noqa: E402 (path set up by _common)
+from catalog_io import read_csv  # noqa: E402
+from catalog_storage import WalStorage  # noqa: E402
+
+
+def test_books_before_a_bad_row_are_logged_and_announced(tmp_path):
+    path = tmp_path / "books.csv"
+    path.write_text(f"title,author,isbn\nFirst,Author,{make_isbn(1)}\nBad,Author,123\n", encoding="utf-8")
+    library = Library(storage=WalStorage(tmp_path / "catalog", durability="none"))
+    view = library.sorted_view("title")
+    with pytest.raises(InvalidISBNError):
+        library.upsert_many(read_csv(str(path)))
+    assert len(library) == 1
+    assert [book.title for book in view] == ["First"]
+    library.close()
+
+    reopened = Library(storage=WalStorage(tmp_path / "catalog", durability="none"))
+    assert [book.title for book in reopened.books] == ["First"]
+    reopened.close()
@@ -0,0 +1,141 @@
+# test_virtual_listbox.py - VirtualListbox row bookkeeping against a fake Tk listbox
+#
+# books_changed() patches the listbox row by row after a library change
+# instead of redrawing it; these tests drive a library at random and check
+# after every step that the rows on screen are exactly the window of the
+# view a full refresh would show.
+import random
+
+import pytest
+
+from _common import make_isbn
+from book_library import Book, BookNotAvailableError, Library  # noqa: E402 (path set up by _common)
+import virtual_listbox  # noqa: E402
+
+ROWS = 12  # rows that fit in the fake listbox
+
+
+# Stand-in for tk.Listbox holding its rows in a list
+class FakeListbox:
+    def __init__(self, master, **options):
+        self.rows = []
+
+    def pack(self, **options):
+        pass
+
+    def bind(self, *args):
+        pass
+
+    def cget(self, option):
+        return None
+
+    def winfo_height(self):
+        return ROWS * FakeFont.LINESPACE
+
+    def size(self):
+        return len(self.rows)
+
+    def delete(self, first, last=None):
+        if last is None:
+            del self.rows[first]
+        else:
+            del self.rows[first:]  # the widget only ever deletes up to END
+
+    def insert(self, index, *rows):
+        if index == virtual_listbox.tk.END:
+            self.rows.extend(rows)
+        else:
+            self.rows[index:index] = rows
+
+
+class FakeScrollbar:
+    def __init__(self, master, **options):
+        pass
+
+    def pack(self, **options):
+        pass
+
+    def set(self, first, last):
+        pass
+
+
+class FakeFont:
+    LINESPACE = 10
+
+    def __init__(self, font):
+        pass
+
+    def metrics(self, option):
+        return self.LINESPACE
+
+
+@pytest.fixture
+def make_listbox(monkeypatch):
+    monkeypatch.setattr(virtual_listbox.ttk.Frame, "__init__", lambda self, master: None)
+    monkeypatch.setattr(virtual_listbox.tk, "Listbox", FakeListbox)
+    monkeypatch.setattr(virtual_listbox.ttk, "Scrollbar", FakeScrollbar)
+    monkeypatch.setattr(virtual_listbox.tkfont, "Font", FakeFont)
+    return lambda: virtual_listbox.VirtualListbox(None)
+
+
+def expected_rows(listbox):
+    books = listbox.books
+    return [str(books[i]) for i in range(listbox.top, min(len(books), listbox.top + ROWS))]
+
+
+# ISBN -> rows, the index books_changed() looks rows up in
+def rows_by_isbn(row_isbns):
+    rows = {}
+    for row, isbn in enumerate(row_isbns):
+        rows.setdefault(isbn, set()).add(row)
+    return rows
+
+
+def change_at_random(library, rng):
+    isbn = make_isbn(rng.randrange(80))
+    roll = rng.random()
+    try:
+        if roll < 0.35:
+            library.lend_book(isbn)
+        elif roll < 0.7:
+            library.return_book(isbn)
+        elif roll < 0.8:
+            library.add_book(Book(f"Title {isbn}", "Author", isbn, rng.randint(1, 2)))
+        elif roll < 0.85:
+            library.upsert_book(Book(f"New title {isbn}", "Author", isbn, rng.randint(1, 3)))
+        elif roll < 0.95:
+            library.remove_book(isbn)
+        else:
+            library.lend_many([make_isbn(rng.randrange(80)) for _ in range(5)])
+    except BookNotAvailableError:
+        pass
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rows_follow_library_changes(make_listbox, seed):
+    rng = random.Random(seed)
+    library = Library()
+    library.bulk_load(Book(f"Title {i}", "Author", make_isbn(i), rng.randint(1, 3)) for i in range(60))
+    available, lent, by_title = make_listbox(), make_listbox(), make_listbox()
+    available.set_books(library.available_view())
+    lent.set_books(library.lent_view())
+    by_title.set_books(library.sorted_view("title", "available"))  # no stable positions: refreshed
+    listboxes = (available, lent, by_title)
+    library.subscribe(lambda event, books: [listbox.books_changed(books) for listbox in listboxes])
+    for _ in range(1000):
+        change_at_random(library, rng)
+        for listbox in listboxes:
+            if rng.random() < 0.1:
+                listbox.scroll(rng.randint(-8, 8))
+            assert listbox.listbox.rows == expected_rows(listbox)
+            assert listbox.row_isbns == [listbox.books[listbox.top + row].isbn for row in range(listbox.listbox.size())]
+            assert listbox.rows_by_isbn == rows_by_isbn(listbox.row_isbns)
+
+
+def test_search_header_rows_are_plain_text(make_listbox):
+    library = Library()
+    library.add_book(Book("Dune", "Frank Herbert", make_isbn(1)))
+    listbox = make_listbox()
+    listbox.set_books(["Search results:"] + list(library))
+    assert listbox.listbox.rows == ["Search results:", str(library.find_books(make_isbn(1))[0])]
+    assert listbox.row_isbns == [None, make_isbn(1)]
@@ -1,58 +1,984 @@
 # book_library.py
+import base64
+import contextlib
+import functools
+import gc
+import json
+import sys
+import threading
+import unicodedata
 
 # Custom exception for unavailable book lending
 class BookNotAvailableError(Exception):
     pass
 
+# Raised when a book's ISBN is already held and the policy is to reject it
+class DuplicateISBNError(Exception):
+    pass
+
+# Raised for text that is not a valid ISBN-10 or ISBN-13. A ValueError, so
+# callers that already reject bad input that way catch it too.
+class InvalidISBNError(ValueError):
+    pass
+
+# Distinct ISBNs whose canonical form normalize_isbn() remembers
+ISBN_CACHE_SIZE = 65536
+
+# Canonical ISBN-13 key of an ISBN typed or imported in any usual form:
+# hyphens and spaces are dropped, the check digit is verified and ISBN-10s
+# are converted ("0-306-40615-2" -> "9780306406157"). Raises
+# InvalidISBNError. Memoized, so imports repeating an ISBN parse it once.
+@functools.lru_cache(maxsize=ISBN_CACHE_SIZE)
+def normalize_isbn(isbn):
+    text = "".join(str(isbn).split()).replace("-", "").upper()
+    if len(text) == 10 and text[:9].isdigit() and (text[9].isdigit() or text[9] == "X"):
+        check = 10 if text[9] == "X" else int(text[9])
+        if (sum((10 - i) * int(digit) for i, digit in enumerate(text[:9])) + check) % 11 == 0:
+            return _with_check_digit("978" + text[:9])
+    elif len(text) == 13 and text.isdigit() and text[:3] in ("978", "979"):
+        if _with_check_digit(text[:12]) == text:
+            return isbn if isbn == text else text  # the cache then holds one string, not two
+    raise InvalidISBNError(f"{isbn!r} is not a valid ISBN-10 or ISBN-13.")
+
+# The canonical key of `isbn`, or `isbn` unchanged if it is not a valid
+# ISBN; for batch lookups, where an invalid ISBN simply matches nothing
+def isbn_key(isbn):
+    try:
+        return normalize_isbn(isbn)
+    except InvalidISBNError:
+        return isbn
+
+def is_valid_isbn(isbn):
+    try:
+        normalize_isbn(isbn)
+    except InvalidISBNError:
+        return False
+    return True
+
+def _with_check_digit(first12):
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(first12))
+    return first12 + str(-total % 10)
+
+# Canonical caseless form of a title, name or query, for matching and
+# sorting text. NFKC before and after casefold() so composed and
+# decomposed accents ("e\u0301" vs "\u00e9") and case variants ("MÜLLER",
+# "müller") all meet; runs of whitespace become one space.
+def normalize_text(text):
+    folded = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(unicodedata.normalize("NFKC", folded).split())
+
+# Key of the author index
+def normalize_author(author):
+    return normalize_text(author)
+
 # Book class with basic attributes
+# One Book is the library's holding of a title: the bibliographic record plus
+# how many copies there are and how many of them are lent out.
+# __slots__ keeps per-instance memory small for multi-million-title catalogs
 class Book:
-    def __init__(self, title, author, isbn):
+    __slots__ = ("title", "author", "isbn", "copies", "lent_copies")
+
+    def __init__(self, title, author, isbn, copies=1):
         self.title = title
-        self.author = author
-        self.isbn = isbn
-        self.is_lent = False  # Track if the book is currently lent out
+        self.author = sys.intern(author) if type(author) is str else author  # shared per author
+        self.isbn = normalize_isbn(isbn)  # canonical ISBN-13; raises InvalidISBNError
+        self.copies = copies
+        self.lent_copies = 0
+
+    @property
+    def available_copies(self):
+        return self.copies - self.lent_copies
+
+    # True once every copy is lent out; setting it lends or returns them all
+    @property
+    def is_lent(self):
+        return self.lent_copies >= self.copies
+
+    @is_lent.setter
+    def is_lent(self, lent):
+        self.lent_copies = self.copies if lent else 0
 
     def __str__(self):
-        return f"{self.title} by {self.author} (ISBN: {self.isbn})"
+        return f"{self.title} by {self.author} (ISBN: {self.isbn}){self._holding()}"
 
-# Library class to manage books
-class Library:
+    # Availability suffix for titles held in more than one copy
+    def _holding(self):
+        return f" [{self.available_copies} of {self.copies} available]" if self.copies != 1 else ""
+
+# Set of books with O(1) add/discard that also keeps a dense, indexable order.
+# Discard moves the last book into the freed slot, so positions are stable
+# except for that one book.
+class _BookSet:
+    stable_positions = True  # removal only disturbs the removed slots and the tail
+
+    def __init__(self):
+        self._items = []
+        self._positions = {}  # id(book) -> index in _items
+
+    def add(self, book):
+        if id(book) not in self._positions:
+            self._positions[id(book)] = len(self._items)
+            self._items.append(book)
+
+    def extend(self, books):
+        items = self._items
+        positions = self._positions
+        for book in books:
+            if id(book) not in positions:
+                positions[id(book)] = len(items)
+                items.append(book)
+
+    def discard(self, book):
+        position = self._positions.pop(id(book), None)
+        if position is None:
+            return
+        last = self._items.pop()
+        if last is not book:
+            self._items[position] = last
+            self._positions[id(last)] = position
+
+    # Put `new` in the slot of `old`, if `old` is in the set
+    def replace(self, old, new):
+        position = self._positions.pop(id(old), None)
+        if position is not None:
+            self._items[position] = new
+            self._positions[id(new)] = position
+
+    def __contains__(self, book):
+        return id(book) in self._positions
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __iter__(self):
+        return iter(self._items)
+
+# Change notifications. Observers are called as callback(event, books) with
+# one of the event names below and the list of books the change touched;
+# batch operations notify once with every book they changed.
+BOOKS_ADDED = "added"
+BOOKS_REMOVED = "removed"
+BOOKS_LENT = "lent"
+BOOKS_RETURNED = "returned"
+
+class Observable:
     def __init__(self):
-        self.books = []  # Store all books
+        self._observers = []
+
+    def subscribe(self, callback):
+        self._observers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._observers.remove(callback)
+
+    def _notify(self, event, books):
+        if books:
+            for callback in list(self._observers):
+                callback(event, books)
+
+# Per-ISBN outcomes reported by lend_many/return_many
+RESULT_OK = "ok"
+RESULT_ALREADY_LENT = "already lent"
+RESULT_NOT_LENT = "not lent"
+RESULT_UNKNOWN = "unknown"
+
+# Read-write lock: any number of readers or one writer. A thread holding the
+# write lock may also take the read lock (e.g. an observer reading the
+# library while a change is being announced). Readers are not held back by
+# waiting writers, so read sections nested in other read sections are safe.
+class _RWLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # thread ident of the writer, if any
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._cond:
+            while self._writer is not None:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    # True if the calling thread holds the write lock
+    def is_writer(self):
+        return self._writer == threading.get_ident()
+
+    # Wait until no writer is waiting, or for at most `timeout` seconds. A
+    # thread running one read section after another calls this in between,
+    # so writers get their turn instead of waiting for the whole run. The
+    # timeout keeps it from waiting forever on a writer that waits in turn
+    # for a reader waiting on this thread (e.g. a search while the index
+    # is built).
+    def yield_to_writers(self, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._waiting_writers, timeout)
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+# Number of locks the ISBNs are spread over for lend/return
+LOCK_STRIPES = 64
+
+# Books the search index takes in per hold of the read lock while it is built
+SEARCH_CHUNK = 1000
+# Longest the build waits for waiting writers between chunks, in seconds
+SEARCH_YIELD = 0.1
+
+# Removed books leave a hole (None) in Library._books; the list is compacted
+# once holes make up more than this share of it, and there are at least
+# COMPACT_MIN_HOLES of them
+COMPACT_RATIO = 0.25
+COMPACT_MIN_HOLES = 1024
+
+# What Library.add_book does with a book whose ISBN is already held
+DUPLICATES_REJECT = "reject"
+DUPLICATES_REPLACE = "replace"
+DUPLICATES_MERGE = "merge"
+DUPLICATE_POLICIES = (DUPLICATES_REJECT, DUPLICATES_REPLACE, DUPLICATES_MERGE)
+
+# Sort orders of Library.query(): name -> key of a book. Every key ends with
+# the ISBN, so keys are unique and a cursor (the key of the last book on a
+# page) always points between two books.
+def _title_order(book):
+    return normalize_text(book.title), book.isbn
+
+def _author_order(book):
+    return normalize_author(book.author), normalize_text(book.title), book.isbn
+
+def _isbn_order(book):
+    return (book.isbn,)
+
+ORDERS = {"title": _title_order, "author": _author_order, "isbn": _isbn_order}
+
+# Range bound of query() for the leading field of an order, as a key prefix
+def _bound(order_by, value):
+    if order_by == "isbn":
+        return ("".join(str(value).split()).replace("-", ""),)
+    return (normalize_text(value),)
+
+# Library class to manage books
+# Books are holdings: one record per ISBN, found through a hash index.
+# By default adding a book whose ISBN is already held adds its copies to
+# that record (see add_book for the other policies), and lend/return move
+# one copy at a time in O(1).
+# A title is in the available view while it has a copy on the shelf and in
+# the lent view while at least one copy is out, so it can be in both.
+# Safe to share between threads. Adding and removing books take the write
+# lock; everything else takes the read lock, so lends and returns run side by
+# side and are only serialized per ISBN stripe, which makes each
+# check-then-set atomic. Observers are called with the locks still held, so
+# they see changes in order, but must not add, remove, lend or return books
+# themselves. The live views are not locked and are meant for the GUI thread.
+class Library(Observable):
+    # storage: optional backend (e.g. catalog_storage.WalStorage) that replays
+    # the saved catalog into this library and then records every change
+    # duplicates: default policy for books whose ISBN is already held
+    def __init__(self, storage=None, duplicates=DUPLICATES_MERGE):
+        super().__init__()
+        self.duplicates = duplicates
+        self._policy(None)
+        self._books = []  # Store all books, one per ISBN, in insertion order; None where one was removed
+        self._holes = 0  # number of None entries in _books
+        self._by_isbn = {}  # ISBN -> position in _books
+        self._by_author = {}  # normalized author -> {id(book): book}, in insertion order
+        self._available = _BookSet()  # books with a copy on the shelf
+        self._lent = _BookSet()  # books with a copy checked out
+        self._search_index = None  # see build_search_index()
+        self._search_index_lock = threading.Lock()
+        self._search_ready = threading.Event()  # set once the search index is built
+        self._search_error = None  # exception that stopped the build, if any
+        self._sorted_indexes = {}  # (order name, status) -> sorted_index.SortedIndex, built on first use
+        self._notifying = threading.local()  # .depth: observer calls running on this thread
+        self._rw_lock = _RWLock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._shelf_lock = threading.Lock()  # guards _available/_lent and storage under the read lock
+        self.storage = storage
+        if storage is not None:
+            storage.open(self)
+
+    def _log(self, op, value):
+        if self.storage is not None:
+            self.storage.record(op, value)
 
-    def add_book(self, book):
-        self.books.append(book)
+    # A snapshot writes out the whole catalog, so it is only taken under the
+    # write lock, once the change that made it due has let go of its locks
+    def _snapshot_if_due(self):
+        storage = self.storage
+        if storage is not None and storage.snapshot_due():
+            with self._rw_lock.write():
+                if storage.snapshot_due():
+                    storage.snapshot()
 
+    def flush(self):
+        # Push buffered changes to the storage backend, if any
+        if self.storage is not None:
+            with self._rw_lock.write():
+                self.storage.flush()
+
+    def close(self):
+        if self.storage is not None:
+            with self._rw_lock.write():
+                self.storage.close()
+
+    # Every book in insertion order. Without pending removals this is the
+    # internal list itself; otherwise it is a fresh list without the holes.
+    @property
+    def books(self):
+        if not self._holes:
+            return self._books
+        return [book for book in self._books if book is not None]
+
+    def _held(self, isbn):
+        position = self._by_isbn.get(isbn)
+        return None if position is None else self._books[position]
+
+    # Add a book. What happens when its ISBN is already held depends on the
+    # duplicates policy (the library's, unless given here): "merge" adds
+    # its copies to the held book, "replace" puts it in the held book's
+    # place like upsert_book(), "reject" raises DuplicateISBNError.
+    def add_book(self, book, duplicates=None):
+        policy = self._policy(duplicates)
+        with self._rw_lock.write():
+            held = self._held(book.isbn)
+            if held is None:
+                self._insert(book)
+                self._log("add", book_to_dict(book))
+                self._notify(BOOKS_ADDED, [book])
+            elif policy == DUPLICATES_MERGE:
+                held.copies += book.copies
+                held.lent_copies += book.lent_copies
+                self._shelve(held)
+                self._log("add", book_to_dict(book))
+                self._notify(BOOKS_ADDED, [held])
+            elif policy == DUPLICATES_REPLACE:
+                if self._replace(held, book):
+                    self._log("upsert", book_to_dict(book))
+                    self._notify(BOOKS_REMOVED, [held])
+                    self._notify(BOOKS_ADDED, [book])
+            else:
+                raise DuplicateISBNError(f"ISBN {book.isbn} is already in the catalog.")
+        self._snapshot_if_due()
+
+    # Insert the book, or make it the record for its ISBN if one is held.
+    # Copies on loan carry over to the new record, and an identical record
+    # is left alone, so applying the same book again changes nothing.
+    # Returns True if the catalog changed.
+    def upsert_book(self, book):
+        with self._rw_lock.write():
+            held = self._held(book.isbn)
+            if held is None:
+                self._insert(book)
+                self._log("add", book_to_dict(book))
+                self._notify(BOOKS_ADDED, [book])
+            elif self._replace(held, book):
+                self._log("upsert", book_to_dict(book))
+                self._notify(BOOKS_REMOVED, [held])
+                self._notify(BOOKS_ADDED, [book])
+            else:
+                return False
+        self._snapshot_if_due()
+        return True
+
+    # upsert_book() for many books under one lock, with one log record and
+    # one notification per event. O(1) per book. If the iterable raises
+    # partway (say, read_csv() on a bad row), the books upserted so far
+    # stay, are logged and announced, and the error is passed on. Returns
+    # the number of ISBNs that were inserted or changed.
+    def upsert_many(self, books):
+        with self._rw_lock.write():
+            replaced = []
+            changed = {}  # isbn -> book
+            try:
+                for book in books:
+                    held = self._held(book.isbn)
+                    if held is None:
+                        self._insert(book)
+                    elif self._replace(held, book):
+                        # A book this batch already put in was never announced
+                        if changed.pop(book.isbn, None) is None:
+                            replaced.append(held)
+                    else:
+                        continue
+                    changed[book.isbn] = book
+            finally:
+                if changed:
+                    self._log("upsert_many", [book_to_dict(book) for book in changed.values()])
+                    self._notify(BOOKS_REMOVED, replaced)
+                    self._notify(BOOKS_ADDED, list(changed.values()))
+        self._snapshot_if_due()
+        return len(changed)
+
+    def _policy(self, duplicates):
+        policy = self.duplicates if duplicates is None else duplicates
+        if policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicates must be one of {DUPLICATE_POLICIES}, not {policy!r}")
+        return policy
+
+    def _insert(self, book):
+        self._by_isbn[book.isbn] = len(self._books)
+        self._books.append(book)
+        self._by_author.setdefault(normalize_author(book.author), {})[id(book)] = book
+        self._shelve(book)
+
+    # Put `book` in the place of `held` (same ISBN) unless they are the same
+    # record; returns True if it did
+    def _replace(self, held, book):
+        if _same_record(held, book):
+            return False
+        book.lent_copies = held.lent_copies
+        book.copies = max(book.copies, book.lent_copies)
+        # Same slots as the held book, so list views only redraw its rows
+        self._books[self._by_isbn[book.isbn]] = book
+        self._available.replace(held, book)
+        self._lent.replace(held, book)
+        self._shelve(book)
+        key = normalize_author(held.author)
+        bucket = self._by_author[key]
+        del bucket[id(held)]
+        if not bucket:
+            del self._by_author[key]
+        self._by_author.setdefault(normalize_author(book.author), {})[id(book)] = book
+        return True
+
+    # Put a book in the available/lent sets its copy counts call for
+    def _shelve(self, book):
+        if book.lent_copies < book.copies:
+            self._available.add(book)
+        else:
+            self._available.discard(book)
+        if book.lent_copies:
+            self._lent.add(book)
+        else:
+            self._lent.discard(book)
+
+    # Add many books at once, in one pass over the iterable; books with an
+    # ISBN already held follow the duplicates policy, like add_book(). Under
+    # "reject" the books read before the duplicate stay loaded, and so do
+    # the books read before the iterable raised (say, read_csv() on a bad
+    # row); the error is then passed on. With storage attached the result is
+    # saved as a single snapshot instead of one log record per book. Returns
+    # the number of books read.
+    def bulk_load(self, books, duplicates=None):
+        policy = self._policy(duplicates)
+        duplicate = None
+        with self._rw_lock.write():
+            # Millions of new objects would otherwise trigger repeated full GC passes
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            count = 0
+            added = []  # new holdings
+            merged = {}  # id -> existing holding that gained copies
+            replaced = []  # existing holdings a replacement took the place of
+            try:
+                by_isbn = self._by_isbn
+                by_author = self._by_author
+                start = len(self._books)
+                author_keys = {}  # author -> normalized key, so each distinct name is folded once
+                for book in books:
+                    position = by_isbn.get(book.isbn)
+                    if position is not None:
+                        if policy == DUPLICATES_REJECT:
+                            duplicate = book
+                            break
+                        count += 1
+                        if position >= start:
+                            # Repeated within this load; nothing is shelved yet
+                            held = added[position - start]
+                            if policy == DUPLICATES_MERGE:
+                                held.copies += book.copies
+                                held.lent_copies += book.lent_copies
+                            elif not _same_record(held, book):
+                                key = normalize_author(book.author)
+                                added[position - start] = book
+                                old_key = normalize_author(held.author)
+                                del by_author[old_key][id(held)]
+                                if not by_author[old_key]:
+                                    del by_author[old_key]
+                                by_author.setdefault(key, {})[id(book)] = book
+                        elif policy == DUPLICATES_MERGE:
+                            held = self._books[position]
+                            held.copies += book.copies
+                            held.lent_copies += book.lent_copies
+                            merged[id(held)] = held
+                        else:
+                            held = self._books[position]
+                            if self._replace(held, book):
+                                # A book this load already replaced was never announced
+                                if merged.pop(id(held), None) is None:
+                                    replaced.append(held)
+                                merged[id(book)] = book
+                        continue
+                    key = author_keys.get(book.author)
+                    if key is None:
+                        key = author_keys[book.author] = normalize_author(book.author)
+                    count += 1
+                    by_isbn[book.isbn] = start + len(added)
+                    added.append(book)
+                    by_author.setdefault(key, {})[id(book)] = book
+            finally:
+                # Also when the iterable raised: the indexes already point at
+                # the books read so far, so they go in, are saved and are
+                # announced before the error is passed on
+                try:
+                    self._books.extend(added)
+                    self._available.extend(book for book in added if book.lent_copies < book.copies)
+                    self._lent.extend(book for book in added if book.lent_copies)
+                    for book in merged.values():
+                        self._shelve(book)
+                finally:
+                    if gc_was_enabled:
+                        gc.enable()
+                if self.storage is not None:
+                    self.storage.snapshot()
+                self._notify(BOOKS_REMOVED, replaced)
+                self._notify(BOOKS_ADDED, added + list(merged.values()))
+        if duplicate is not None:
+            raise DuplicateISBNError(f"ISBN {duplicate.isbn} is already in the catalog.")
+        return count
+
+    # Remove a title with all its copies, in O(1): its slot in _books is
+    # left empty until the next compaction
     def remove_book(self, isbn):
-        self.books = [book for book in self.books if book.isbn != isbn]
+        isbn = normalize_isbn(isbn)
+        with self._rw_lock.write():
+            book = self._unlink(isbn)
+            if book is not None:
+                self._log("remove", isbn)
+                self._notify(BOOKS_REMOVED, [book])
+                self._maybe_compact()
+        self._snapshot_if_due()
+
+    # Remove many titles under one lock, with one log record and one
+    # notification. Unknown and invalid ISBNs are skipped. Returns the number removed.
+    def remove_many(self, isbns):
+        with self._rw_lock.write():
+            removed = []
+            for isbn in isbns:
+                book = self._unlink(isbn_key(isbn))
+                if book is not None:
+                    removed.append(book)
+            if removed:
+                self._log("remove_many", [book.isbn for book in removed])
+                self._notify(BOOKS_REMOVED, removed)
+                self._maybe_compact()
+        self._snapshot_if_due()
+        return len(removed)
 
+    # Drop isbn from _books and every index; returns the book, or None if unknown
+    def _unlink(self, isbn):
+        position = self._by_isbn.pop(isbn, None)
+        if position is None:
+            return None
+        book = self._books[position]
+        self._books[position] = None
+        self._holes += 1
+        self._available.discard(book)
+        self._lent.discard(book)
+        key = normalize_author(book.author)
+        bucket = self._by_author[key]
+        del bucket[id(book)]
+        if not bucket:
+            del self._by_author[key]
+        return book
+
+    def _maybe_compact(self):
+        if self._holes >= COMPACT_MIN_HOLES and self._holes > COMPACT_RATIO * len(self._books):
+            self._compact()
+
+    # Close the holes removals left in _books, in one O(n) pass
+    def compact(self):
+        with self._rw_lock.write():
+            self._compact()
+
+    def _compact(self):
+        if not self._holes:
+            return
+        self._books = [book for book in self._books if book is not None]
+        by_isbn = self._by_isbn
+        for position, book in enumerate(self._books):
+            by_isbn[book.isbn] = position
+        self._holes = 0
+
+    def find_books(self, isbn):
+        # The holding registered under an ISBN, as a list of zero or one books
+        isbn = normalize_isbn(isbn)
+        with self._rw_lock.read():
+            book = self._held(isbn)
+        return [] if book is None else [book]
+
+    # ISBNs may be given in any form normalize_isbn() accepts
     def lend_book(self, isbn):
-        for book in self.books:
-            if book.isbn == isbn and not book.is_lent:
-                book.is_lent = True
-                return book
-        raise BookNotAvailableError("Book is either not available or already lent.")
+        isbn = normalize_isbn(isbn)
+        with self._rw_lock.read(), self._stripe(isbn):
+            book, _ = self._lend(isbn, "lend")
+            if book is None:
+                raise BookNotAvailableError("Book is either not available or already lent.")
+            self._notify(BOOKS_LENT, [book])
+        self._snapshot_if_due()
+        return book
 
     def return_book(self, isbn):
-        for book in self.books:
-            if book.isbn == isbn and book.is_lent:
-                book.is_lent = False
-                return
-        raise BookNotAvailableError("This book was not lent out.")
+        isbn = normalize_isbn(isbn)
+        with self._rw_lock.read(), self._stripe(isbn):
+            book, _ = self._return(isbn, "return")
+            if book is None:
+                raise BookNotAvailableError("This book was not lent out.")
+            self._notify(BOOKS_RETURNED, [book])
+        self._snapshot_if_due()
+        return book
+
+    # Lend every ISBN in one pass, one copy per occurrence. Nothing is raised;
+    # instead the result is a list of (isbn, RESULT_*) pairs in input order,
+    # with the ISBNs as given (invalid ones are RESULT_UNKNOWN). The successful
+    # ones are logged as one record and observers hear about them in one
+    # notification.
+    def lend_many(self, isbns):
+        return self._circulate_many(isbns, self._lend, "lend_many", BOOKS_LENT)
+
+    def return_many(self, isbns):
+        return self._circulate_many(isbns, self._return, "return_many", BOOKS_RETURNED)
+
+    def _circulate_many(self, isbns, step, op, event):
+        isbns = list(isbns)
+        keys = [isbn_key(isbn) for isbn in isbns]
+        report = []
+        changed = []
+        # Every stripe the batch touches, taken in one fixed order so two
+        # batches can't deadlock
+        with self._rw_lock.read(), self._held_stripes({self._stripe_number(key) for key in keys}):
+            for isbn, key in zip(isbns, keys):
+                book, result = step(key)
+                report.append((isbn, result))
+                if book is not None:
+                    changed.append(book)
+            if changed:
+                with self._shelf_lock:
+                    self._log(op, [book.isbn for book in changed])
+                self._notify(event, list({id(book): book for book in changed}.values()))
+        self._snapshot_if_due()
+        return report
+
+    def _stripe_number(self, isbn):
+        return hash(isbn) % LOCK_STRIPES
+
+    def _stripe(self, isbn):
+        return self._stripes[self._stripe_number(isbn)]
+
+    # Hold the stripes with the given numbers (all of them by default),
+    # taken in one fixed order so two holders can't deadlock
+    @contextlib.contextmanager
+    def _held_stripes(self, numbers=range(LOCK_STRIPES)):
+        locks = [self._stripes[number] for number in sorted(numbers)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    # Observers run with the library's locks held; the depth on this thread
+    # lets _sorted_index() refuse to build from inside one
+    def _notify(self, event, books):
+        depth = getattr(self._notifying, "depth", 0)
+        self._notifying.depth = depth + 1
+        try:
+            super()._notify(event, books)
+        finally:
+            self._notifying.depth = depth
+
+    # Check out one copy; returns (book or None, RESULT_*). The caller
+    # holds the read lock and the ISBN's stripe, which make the
+    # check-then-set atomic; op, if given, is logged along with the change.
+    # The record may trail the change, but both happen under the read lock
+    # and snapshots are taken under the write lock, so no snapshot falls
+    # between them.
+    def _lend(self, isbn, op=None):
+        book = self._held(isbn)
+        if book is None:
+            return None, RESULT_UNKNOWN
+        if book.lent_copies >= book.copies:
+            return None, RESULT_ALREADY_LENT
+        book.lent_copies += 1
+        with self._shelf_lock:
+            self._shelve(book)
+            if op is not None:
+                self._log(op, isbn)
+        return book, RESULT_OK
+
+    def _return(self, isbn, op=None):
+        book = self._held(isbn)
+        if book is None:
+            return None, RESULT_UNKNOWN
+        if not book.lent_copies:
+            return None, RESULT_NOT_LENT
+        book.lent_copies -= 1
+        with self._shelf_lock:
+            self._shelve(book)
+            if op is not None:
+                self._log(op, isbn)
+        return book, RESULT_OK
 
     def __iter__(self):
-        # Custom iterator to yield only available books
-        return (book for book in self.books if not book.is_lent)
+        # Custom iterator to yield the books with a copy available, O(available)
+        with self._rw_lock.read(), self._shelf_lock:
+            return iter(list(self._available))
+
+    def lent_books(self):
+        # Iterator over the books with a copy lent out, O(lent)
+        with self._rw_lock.read(), self._shelf_lock:
+            return iter(list(self._lent))
+
+    def __len__(self):
+        return len(self._books) - self._holes
+
+    # Ranked title/author type-ahead search (see search.SearchIndex). The
+    # first search starts build_search_index() if nothing has yet, and
+    # every search waits until the index is built. Observers of add_book/
+    # remove_book must not search before then: the build needs the read
+    # lock they keep from it.
+    def search(self, query, limit=20, offset=0):
+        if not self._search_ready.is_set():
+            self.build_search_index()
+            if self._rw_lock.is_writer():
+                raise RuntimeError("The search index is still being built.")
+            self._search_ready.wait()
+        if self._search_error is not None:
+            raise RuntimeError("Building the search index failed.") from self._search_error
+        return self._search_index.search(query, limit, offset)
+
+    # Start building the search index on a background thread, so it is
+    # ready before the first search (the GUIs call this at startup). Books
+    # are indexed SEARCH_CHUNK at a time under the read lock, so the library
+    # can change in between; the index follows those changes through its
+    # subscription. Does nothing if the index exists or is being built.
+    def build_search_index(self):
+        with self._search_index_lock:
+            if self._search_index is not None:
+                return
+            from search import SearchIndex
+            index = SearchIndex()
+            # Under the read lock no book can come or go between the
+            # snapshot and the subscription
+            with self._rw_lock.read():
+                books = list(self.books)
+                self.subscribe(index.on_library_changed)
+            self._search_index = index
+        threading.Thread(target=self._index_books, args=(index, books), daemon=True).start()
+
+    # True once the search index is built, so search() answers at once
+    def search_ready(self):
+        return self._search_ready.is_set()
+
+    def _index_books(self, index, books):
+        try:
+            # Sorted as the chunks go in, so no step holds the index for long
+            index.sort_titles()
+            for start in range(0, len(books), SEARCH_CHUNK):
+                self._rw_lock.yield_to_writers(SEARCH_YIELD)
+                with self._rw_lock.read():
+                    # Books removed since the snapshot are left out
+                    index.add_books([book for book in books[start:start + SEARCH_CHUNK]
+                                     if self._held(book.isbn) is book])
+        except BaseException as exc:
+            self._search_error = exc
+            raise
+        finally:
+            self._search_ready.set()
+
+    # One page of books in a stable order, without walking the catalog up
+    # to it. filter is None for every book, "available" or "lent"; order_by
+    # is a key of ORDERS. start and stop limit the page to a range of the
+    # leading sort field, start included and stop not, compared like the
+    # order does: query(order_by="author", start="A", stop="D") pages
+    # through the authors from A to C. Returns (books, cursor): pass the
+    # cursor back to get the next page, which starts right after the last
+    # book of this one even if books were added or removed meanwhile; it is
+    # None after the last page. Served from a sorted index (see
+    # sorted_view), so a page costs O(log n + limit).
+    def query(self, filter=None, order_by="title", limit=50, cursor=None, start=None, stop=None):
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, not {limit!r}")
+        index = self._sorted_index(order_by, filter)
+        if cursor is not None:
+            start, after = decode_cursor(cursor, order_by), True
+        else:
+            start, after = None if start is None else _bound(order_by, start), False
+        stop = None if stop is None else _bound(order_by, stop)
+        # One book past the page tells whether there is a next one
+        page = index.take(start, stop, after, limit + 1)
+        if len(page) <= limit:
+            return page, None
+        del page[limit:]
+        return page, encode_cursor(order_by, index.key(page[-1]))
+
+    # Live, read-only sequence of every, the available or the lent books
+    # (status None, "available" or "lent") in a sort order of ORDERS; len()
+    # and indexing are O(log n), for list views. Each (order, status) index
+    # is built in one sort on first use and then kept up to date on every
+    # change, at O(log n) per book.
+    def sorted_view(self, order_by="title", status=None):
+        return self._sorted_index(order_by, status)
+
+    def _sorted_index(self, order_by, status):
+        if order_by not in ORDERS:
+            raise ValueError(f"order_by must be one of {tuple(ORDERS)}, not {order_by!r}")
+        if status not in (None, "available", "lent"):
+            raise ValueError(f"status must be None, 'available' or 'lent', not {status!r}")
+        index = self._sorted_indexes.get((order_by, status))  # no lock once built
+        if index is not None:
+            return index
+        if getattr(self._notifying, "depth", 0):
+            raise RuntimeError(f"The {order_by!r} view can't be built from inside a library observer; "
+                               "call sorted_view() once beforehand.")
+        from sorted_index import SortedIndex
+        # Under the read lock and every stripe no book can come, go, be lent
+        # or be returned between the initial load and the subscription, while
+        # other readers carry on. Holding every stripe also makes builders
+        # take turns, so each index is built once.
+        with self._rw_lock.read(), self._held_stripes():
+            index = self._sorted_indexes.get((order_by, status))
+            if index is None:
+                index = SortedIndex(ORDERS[order_by], self.books, status)
+                self.subscribe(index.on_library_changed)
+                self._sorted_indexes[order_by, status] = index
+        return index
+
+    # Live, read-only sequences of the available and lent books. len() and
+    # indexing are O(1), which lets list views fetch just the rows on screen.
+    def available_view(self):
+        return self._available
+
+    def lent_view(self):
+        return self._lent
+
+    def available_count(self):
+        return len(self._available)
+
+    def lent_count(self):
+        return len(self._lent)
 
     def books_by_author(self, author):
-        # Generator function to yield books by specific author
-        return (book for book in self.books if book.author.lower() == author.lower())
+        # Generator over the author index; costs only as much as the matches
+        with self._rw_lock.read():
+            bucket = self._by_author.get(normalize_author(author), {})
+            return iter(list(bucket.values()))
+
+    # Generator over all, available or lent books that copies chunk_size
+    # references at a time instead of the whole collection, so exporting a
+    # huge catalog keeps memory flat. Each chunk is copied under the read
+    # lock; books added or removed mid-stream may be skipped or repeated.
+    def stream(self, status=None, chunk_size=1000):
+        start = 0
+        while True:
+            with self._rw_lock.read(), self._shelf_lock:
+                books = {None: self._books, "available": self._available, "lent": self._lent}[status]
+                chunk = books[start:start + chunk_size]
+            if not chunk:
+                return
+            for book in chunk:
+                if book is not None:
+                    yield book
+            start += chunk_size
 
 # Subclass for digital libraries with download size
 class EBook(Book):
-    def __init__(self, title, author, isbn, download_size):
-        super().__init__(title, author, isbn)
+    __slots__ = ("download_size",)
+
+    def __init__(self, title, author, isbn, download_size, copies=1):
+        super().__init__(title, author, isbn, copies)
         self.download_size = download_size  # in MB
 
     def __str__(self):
-        return f"{self.title} by {self.author} (eBook, {self.download_size}MB)"
\ No newline at end of file
+        return f"{self.title} by {self.author} (eBook, {self.download_size}MB){self._holding()}"
+
+# A book as a storage backend saved it, rebuilt without validating its
+# ISBN: that was done when the book was added. A row from before ISBNs were
+# checked then can't make the whole catalog unreadable; the backends set
+# such rows aside (see is_valid_isbn) rather than serve them.
+def stored_book(title, author, isbn, copies=1, lent_copies=0, download_size=None):
+    book = object.__new__(Book if download_size is None else EBook)
+    book.title = title
+    book.author = sys.intern(author) if type(author) is str else author
+    book.isbn = isbn
+    book.copies = copies
+    book.lent_copies = lent_copies
+    if download_size is not None:
+        book.download_size = download_size
+    return book
+
+# True if putting `book` in the place of `held` (same ISBN) would change
+# nothing; held copies still on loan keep the count from dropping below them
+def _same_record(held, book):
+    return (type(held) is type(book) and held.title == book.title and held.author == book.author
+            and held.copies == max(book.copies, held.lent_copies)
+            and getattr(held, "download_size", None) == getattr(book, "download_size", None))
+
+# Opaque query() cursors: the sort order and the sort key of the last book
+# on the page, as URL-safe text so they can travel in a query string
+def encode_cursor(order_by, key):
+    return base64.urlsafe_b64encode(json.dumps([order_by, list(key)]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, order_by):
+    try:
+        order, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError(f"Invalid cursor {cursor!r}") from None
+    if not isinstance(key, list) or not all(isinstance(part, str) for part in key):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if order != order_by:
+        raise ValueError(f"Cursor is for order_by={order!r}, not {order_by!r}")
+    return tuple(key)
+
+# Plain-dict form of a book, used by storage backends and exporters
+def book_to_dict(book):
+    data = {"title": book.title, "author": book.author, "isbn": book.isbn,
+            "copies": book.copies, "lent_copies": book.lent_copies}
+    if isinstance(book, EBook):
+        data["download_size"] = book.download_size
+    return data
+
+# Also reads the older one-copy form with an is_lent flag. stored=True is for
+# what a storage backend saved: the ISBN is not validated again (see
+# stored_book), only brought to canonical form if it is valid.
+def book_from_dict(data, stored=False):
+    copies = data.get("copies", 1)
+    if stored:
+        lent_copies = data["lent_copies"] if "lent_copies" in data else copies if data.get("is_lent") else 0
+        return stored_book(data["title"], data["author"], isbn_key(data["isbn"]), copies, lent_copies,
+                           data.get("download_size"))
+    if "download_size" in data:
+        book = EBook(data["title"], data["author"], data["isbn"], data["download_size"], copies)
+    else:
+        book = Book(data["title"], data["author"], data["isbn"], copies)
+    if "lent_copies" in data:
+        book.lent_copies = data["lent_copies"]
+    else:
+        book.is_lent = bool(data.get("is_lent", False))
+    return book
\ No newline at end of file
@@ -0,0 +1,190 @@
+# catalog_storage.py
+import json
+import os
+import warnings
+
+from book_library import (
+    DUPLICATES_MERGE, RESULT_OK, BookNotAvailableError, DuplicateISBNError, book_from_dict, book_to_dict,
+    is_valid_isbn,
+)
+
+# How often the write-ahead log is fsync'ed
+DURABILITY_MODES = ("op", "batch", "none")
+
+# Persistent Library backend: an append-only write-ahead log (WAL) of
+# add/upsert/remove/lend/return operations (batches are one record) plus a periodically compacted snapshot.
+# Every WAL record carries a sequence number and the snapshot remembers the
+# last one it contains, so startup loads the snapshot and replays only the
+# records written after it. The library takes the snapshot, under its write
+# lock, when snapshot_due() says one is due; records only count towards it.
+# A record that no longer applies (say, a lend of a copy the snapshot
+# already shows as lent) is skipped on replay and listed in `skipped`.
+# Stored ISBNs are not validated again; a book whose ISBN fails validation
+# (saved before ISBNs were checked) is moved to a quarantine file next to
+# the snapshot instead of being loaded.
+class WalStorage:
+    def __init__(self, directory, durability="batch", batch_size=256, snapshot_every=50000):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}, not {durability!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.wal_path = os.path.join(directory, "catalog.wal")
+        self.snapshot_path = os.path.join(directory, "catalog.snapshot")
+        self.quarantine_path = os.path.join(directory, "catalog.quarantine")
+        self.durability = durability
+        self.batch_size = batch_size  # records per fsync in "batch" mode
+        self.snapshot_every = snapshot_every  # records between compactions, 0 to disable
+        self._library = None
+        self._wal = None
+        self._replaying = False
+        self._seq = 0  # sequence number of the last record written or replayed
+        self._unsynced = 0
+        self._since_snapshot = 0
+        self.skipped = []  # (seq, op, reason) of the records replay skipped
+        self.quarantined = []  # book dicts with an invalid ISBN set aside by open()
+
+    # Replay the snapshot and WAL tail into `library`, then start logging its changes
+    def open(self, library):
+        self._replaying = True
+        try:
+            self._seq = self._load_snapshot(library)
+            self._since_snapshot = self._replay_wal(library)
+        finally:
+            self._replaying = False
+        self._library = library
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        if self.quarantined:
+            with open(self.quarantine_path, "a", encoding="utf-8") as out:
+                for data in self.quarantined:
+                    out.write(json.dumps(data) + "\n")
+            # A fresh snapshot without them, so the next open doesn't meet them again
+            self.snapshot()
+
+    def record(self, op, value):
+        if self._replaying or self._wal is None:
+            return
+        self._seq += 1
+        self._wal.write(json.dumps({"seq": self._seq, "op": op, "value": value}) + "\n")
+        self._unsynced += 1
+        self._since_snapshot += 1
+        if self.durability == "op" or (self.durability == "batch" and self._unsynced >= self.batch_size):
+            self.flush()
+
+    def snapshot_due(self):
+        return bool(self._wal is not None and self.snapshot_every and self._since_snapshot >= self.snapshot_every)
+
+    def flush(self):
+        if self._wal is None:
+            return
+        self._wal.flush()
+        if self.durability != "none" and self._unsynced:
+            os.fsync(self._wal.fileno())
+        self._unsynced = 0
+
+    # Compact: write the whole catalog to a new snapshot and empty the WAL
+    def snapshot(self):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write(json.dumps({"seq": self._seq}) + "\n")
+            for book in self._library.books:
+                out.write(json.dumps(book_to_dict(book)) + "\n")
+            out.flush()
+            if self.durability != "none":
+                os.fsync(out.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # A crash before the truncate is harmless: replay skips records the snapshot covers
+        self._wal.close()
+        self._wal = open(self.wal_path, "w", encoding="utf-8")
+        self._unsynced = 0
+        self._since_snapshot = 0
+
+    def close(self):
+        if self._wal is not None:
+            self.flush()
+            self._wal.close()
+            self._wal = None
+
+    def _load_snapshot(self, library):
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, encoding="utf-8") as snapshot:
+            seq = json.loads(snapshot.readline())["seq"]
+            for line in snapshot:
+                for book in self._stored_books([json.loads(line)]):
+                    library.add_book(book, duplicates=DUPLICATES_MERGE)
+        return seq
+
+    # The books of saved dicts, without validating their ISBNs again; the
+    # ones whose ISBN is invalid are left out and quarantined
+    def _stored_books(self, items):
+        books = []
+        for data in items:
+            book = book_from_dict(data, stored=True)
+            if is_valid_isbn(book.isbn):
+                books.append(book)
+            else:
+                self.quarantined.append(data)
+        return books
+
+    def _replay_wal(self, library):
+        if not os.path.exists(self.wal_path):
+            return 0
+        replayed = 0
+        good_end = 0
+        with open(self.wal_path, "rb") as wal:
+            for line in wal:
+                # A torn write from a crash ends the log; it is cut off below
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry["seq"] > self._seq:
+                    try:
+                        _apply(library, entry["op"], entry["value"], self._stored_books)
+                    except (BookNotAvailableError, DuplicateISBNError, KeyError, TypeError, ValueError) as exc:
+                        self.skipped.append((entry["seq"], entry["op"], str(exc)))
+                    self._seq = entry["seq"]
+                    replayed += 1
+                good_end += len(line)
+        if good_end != os.path.getsize(self.wal_path):
+            with open(self.wal_path, "r+b") as wal:
+                wal.truncate(good_end)
+        if self.skipped:
+            warnings.warn(f"{self.wal_path}: skipped {len(self.skipped)} WAL record(s) that no longer apply, "
+                          f"first seq {self.skipped[0][0]}: {self.skipped[0][2]}", RuntimeWarning)
+        return replayed
+
+
+# load: WalStorage._stored_books, which reads the books of add/upsert records
+def _apply(library, op, value, load):
+    # "add" records were logged by add_book merging copies, or inserting a new ISBN
+    if op == "add":
+        for book in load([value]):
+            library.add_book(book, duplicates=DUPLICATES_MERGE)
+    elif op == "upsert":
+        for book in load([value]):
+            library.upsert_book(book)
+    elif op == "upsert_many":
+        library.upsert_many(load(value))
+    elif op == "remove":
+        library.remove_book(value)
+    elif op == "remove_many":
+        library.remove_many(value)
+    elif op == "lend":
+        library.lend_book(value)
+    elif op == "return":
+        library.return_book(value)
+    elif op == "lend_many":
+        _check_report(library.lend_many(value))
+    elif op == "return_many":
+        _check_report(library.return_many(value))
+    else:
+        raise ValueError(f"Unknown WAL operation {op!r}")
+
+
+# The rest of a batch record is applied; the ISBNs that weren't are reported
+def _check_report(report):
+    failed = [f"{isbn} ({result})" for isbn, result in report if result != RESULT_OK]
+    if failed:
+        raise BookNotAvailableError(f"Not applied: {', '.join(failed)}")
@@ -0,0 +1,164 @@
+# sorted_index.py
+import bisect
+import itertools
+import threading
+
+from book_library import BOOKS_ADDED, BOOKS_LENT, BOOKS_REMOVED, BOOKS_RETURNED
+
+# Which books a status index holds: status -> test of a book
+STATUSES = {
+    None: lambda book: True,
+    "available": lambda book: book.lent_copies < book.copies,
+    "lent": lambda book: book.lent_copies > 0,
+}
+
+# Books in the order of a key function, as a bucketed sorted list: a list of
+# sorted buckets of up to 2 * LOAD books, plus the key of each bucket's last
+# book. Finding a book's place is a bisect over the bucket maxima and one
+# inside its bucket, so add and remove cost O(log n) comparisons plus a
+# shift of at most 2 * LOAD references, and a scan can start at any key in
+# O(log n). Keys are computed from the books when compared rather than
+# stored, which keeps the index at about one reference per book; they must
+# be unique (end them with the ISBN) and must not change while a book is in
+# the index. With a status the index only holds the available or the lent
+# books. Like search.SearchIndex the index subscribes to the library and
+# follows its changes, and a lock makes it safe to read from any thread.
+class SortedIndex:
+    LOAD = 1000
+
+    def __init__(self, key, books=(), status=None):
+        self.key = key
+        self.status = status
+        self._accepts = STATUSES[status]
+        self._lock = threading.Lock()
+        self._buckets = []
+        self._maxes = []  # key of the last book in each bucket
+        self._starts = None  # position of each bucket's first book, rebuilt on demand
+        self._len = 0
+        self._update([book for book in books if self._accepts(book)])
+
+    def on_library_changed(self, event, books):
+        with self._lock:
+            if event == BOOKS_REMOVED:
+                for book in books:
+                    self._remove(book)
+            elif event == BOOKS_ADDED or self.status is not None and event in (BOOKS_LENT, BOOKS_RETURNED):
+                accepted = []
+                for book in books:
+                    if self._accepts(book):
+                        accepted.append(book)
+                    else:
+                        self._remove(book)  # e.g. a holding merged copies and is now all lent
+                self._update(accepted)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(itertools.chain.from_iterable(self._buckets)))
+
+    # Book at a position in the order, in O(log n) once the bucket starts
+    # are known; they are recomputed after a change, in O(n / LOAD)
+    def __getitem__(self, index):
+        with self._lock:
+            if index < 0:
+                index += self._len
+            if not 0 <= index < self._len:
+                raise IndexError("view index out of range")
+            if self._starts is None:
+                self._starts = list(itertools.accumulate((len(bucket) for bucket in self._buckets[:-1]), initial=0))
+            i = bisect.bisect_right(self._starts, index) - 1
+            return self._buckets[i][index - self._starts[i]]
+
+    # Up to `limit` books with start <= key < stop, in order (without a
+    # bound, from the first or to the last book). after=True leaves out a
+    # book whose key equals start, for resuming after a book already seen.
+    def take(self, start=None, stop=None, after=False, limit=None):
+        with self._lock:
+            return list(itertools.islice(self._scan(start, stop, after), limit))
+
+    # take() as a generator, without the lock: for owners that keep the
+    # index from changing while they iterate (see search.SearchIndex)
+    def scan(self, start=None, stop=None, after=False):
+        return self._scan(start, stop, after)
+
+    def _scan(self, start, stop, after):
+        i = j = 0
+        if start is not None:
+            find = bisect.bisect_right if after else bisect.bisect_left
+            i = find(self._maxes, start)
+            if i == len(self._maxes):
+                return
+            j = find(self._buckets[i], start, key=self.key)
+        key = self.key
+        for bucket in self._buckets[i:]:
+            for book in bucket[j:] if j else bucket:
+                if stop is not None and key(book) >= stop:
+                    return
+                yield book
+            j = 0
+
+    # Add a book; books already in the index are left alone
+    def _add(self, book):
+        key = self.key(book)
+        maxes = self._maxes
+        if not maxes:
+            self._buckets.append([book])
+            maxes.append(key)
+            self._len += 1
+            self._starts = None
+            return
+        i = bisect.bisect_left(maxes, key)
+        if i == len(maxes):
+            # Past every book: append to the last bucket
+            i -= 1
+            bucket = self._buckets[i]
+            bucket.append(book)
+            maxes[i] = key
+        else:
+            bucket = self._buckets[i]
+            j = bisect.bisect_left(bucket, key, key=self.key)
+            if bucket[j] is book:
+                return
+            bucket.insert(j, book)
+        self._len += 1
+        self._starts = None
+        if len(bucket) > 2 * self.LOAD:
+            self._buckets[i:i + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            maxes.insert(i, self.key(bucket[self.LOAD - 1]))
+
+    # Add many books. Large batches rebuild the buckets with one sort, which
+    # is cheaper than placing every book on its own.
+    def _update(self, books):
+        if len(books) * 8 < self._len:
+            for book in books:
+                self._add(book)
+            return
+        # The batch may repeat books already indexed (merged holdings)
+        unique = {id(book): book for book in itertools.chain.from_iterable(self._buckets)}
+        unique.update((id(book), book) for book in books)
+        ordered = sorted(unique.values(), key=self.key)
+        self._buckets = [ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)]
+        self._maxes = [self.key(bucket[-1]) for bucket in self._buckets]
+        self._len = len(ordered)
+        self._starts = None
+
+    # Remove a book; books not in the index are ignored
+    def _remove(self, book):
+        key = self.key(book)
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return
+        bucket = self._buckets[i]
+        j = bisect.bisect_left(bucket, key, key=self.key)
+        if bucket[j] is not book:
+            return
+        del bucket[j]
+        self._len -= 1
+        self._starts = None
+        if not bucket:
+            del self._buckets[i]
+            del self._maxes[i]
+        elif j == len(bucket):
+            self._maxes[i] = self.key(bucket[-1])
@@ -1,8 +1,34 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
-from book_library import Book, EBook, Library, BookNotAvailableError
-
-library = Library()
+from book_library import Book, EBook, Library, BookNotAvailableError, InvalidISBNError, normalize_isbn
+from catalog_storage import WalStorage
+from library_server import RemoteLibrary
+from sqlite_library import SqliteLibrary
+from virtual_listbox import VirtualListbox
+import sys
+
+# Catalog is kept on disk here between runs
+DATA_DIR = "library_data"
+
+# Most results the search box shows
+SEARCH_LIMIT = 200
+
+# Orders the book lists can be sorted in: label -> Library.sorted_view
+# order, None for the order the books were added in
+SORT_ORDERS = {"Added": None, "Title": "title", "Author": "author", "ISBN": "isbn"}
+
+# A .db/.sqlite path on the command line opens that SQLite catalog instead,
+# an http:// URL the shared catalog of a library_server.py
+def open_library(argv):
+    if len(argv) > 1 and argv[1].startswith("http://"):
+        return RemoteLibrary(argv[1])
+    if len(argv) > 1 and argv[1].endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteLibrary(argv[1])
+    return Library(storage=WalStorage(DATA_DIR, durability="op"))
+
+library = open_library(sys.argv)
+if isinstance(library, Library):
+    library.build_search_index()  # in the background, ready for the first search
 root = tk.Tk()
 root.title("Library Management System")
 root.geometry("700x550")
@@ -27,6 +53,7 @@ def add_book():
     isbn = isbn_entry.get()
     is_ebook = ebook_var.get()
     size = size_entry.get()
+    copies = copies_spinbox.get()
 
     if not title or not author or not isbn:
         messagebox.showerror("Error", "Title, Author, and ISBN are required.")
@@ -39,13 +66,24 @@ def add_book():
         if not size.isdigit():
             messagebox.showerror("Error", "Download size must be a number.")
             return
-        book = EBook(title, author, isbn, size)
+
+    if not copies.isdigit() or int(copies) < 1:
+        messagebox.showerror("Error", "Copies must be a whole number of at least 1.")
+        return
+
+    try:
+        isbn = normalize_isbn(isbn)
+    except InvalidISBNError as e:
+        messagebox.showerror("Error", str(e))
+        return
+
+    if is_ebook:
+        book = EBook(title, author, isbn, size, int(copies))
     else:
-        book = Book(title, author, isbn)
+        book = Book(title, author, isbn, int(copies))
 
     library.add_book(book)
     messagebox.showinfo("Success", f"Book '{title}' added.")
-    update_book_list()
     clear_inputs()
 
 def lend_book():
@@ -54,8 +92,7 @@ def lend_book():
         try:
             library.lend_book(isbn)
             messagebox.showinfo("Success", "Book lent successfully.")
-            update_book_list()
-        except BookNotAvailableError as e:
+        except (BookNotAvailableError, InvalidISBNError) as e:
             messagebox.showerror("Error", str(e))
 
 def return_book():
@@ -64,42 +101,70 @@ def return_book():
         try:
             library.return_book(isbn)
             messagebox.showinfo("Success", "Book returned successfully.")
-            update_book_list()
-        except BookNotAvailableError as e:
+        except (BookNotAvailableError, InvalidISBNError) as e:
             messagebox.showerror("Error", str(e))
 
 def remove_book():
     isbn = simpledialog.askstring("Remove Book", "Enter ISBN to remove:")
     if isbn:
-        library.remove_book(isbn)
-        messagebox.showinfo("Success", "Book removed.")
-        update_book_list()
+        try:
+            library.remove_book(isbn)
+            messagebox.showinfo("Success", "Book removed.")
+        except InvalidISBNError as e:
+            messagebox.showerror("Error", str(e))
 
 def view_books_by_author():
     author = simpledialog.askstring("Search by Author", "Enter author's name:")
     if author:
         books = list(library.books_by_author(author))
         if books:
-            available_listbox.delete(0, tk.END)
-            lent_listbox.delete(0, tk.END)
-            available_listbox.insert(tk.END, f"Books by {author}:")
-            for book in books:
-                if book.is_lent:
-                    lent_listbox.insert(tk.END, str(book))
-                else:
-                    available_listbox.insert(tk.END, str(book))
+            show_results(f"Books by {author}:", books)
         else:
             messagebox.showinfo("Not Found", "No books found by this author.")
 
-def update_book_list():
-    available_listbox.delete(0, tk.END)
-    lent_listbox.delete(0, tk.END)
+def search_books(event=None):
+    query = search_entry.get().strip()
+    if not query:
+        update_book_list()
+        return
+    # Searching here runs on the GUI thread, so don't wait for the index
+    if isinstance(library, Library) and not library.search_ready():
+        messagebox.showinfo("Search", "The search index is still being built. Try again in a moment.")
+        return
+    books = library.search(query, limit=SEARCH_LIMIT)
+    show_results(f"Results for '{query}':" if books else f"No results for '{query}'", books)
+
+# Show a result list in the tabs until the next library change
+def show_results(header, books):
+    global showing_search
+    available_listbox.set_books([header] + [book for book in books if book.available_copies])
+    lent_listbox.set_books([book for book in books if book.lent_copies])
+    showing_search = True
+
+def update_book_list(event=None):
+    global showing_search
+    showing_search = False
+    order = SORT_ORDERS[sort_box.get()]
+    if order is None:
+        available_listbox.set_books(library.available_view())
+        lent_listbox.set_books(library.lent_view())
+    else:
+        # The library keeps these sorted, so nothing is sorted here
+        available_listbox.set_books(library.sorted_view(order, "available"))
+        lent_listbox.set_books(library.sorted_view(order, "lent"))
+
+# Library observer: touch only the rows the change affected. A lend or
+# return can change a title in both tabs (copy counts), so both catch up.
+def on_library_changed(event, books):
+    if showing_search:
+        update_book_list()
+    else:
+        available_listbox.books_changed(books)
+        lent_listbox.books_changed(books)
 
-    for book in library.books:
-        if not book.is_lent:
-            available_listbox.insert(tk.END, str(book))
-        else:
-            lent_listbox.insert(tk.END, str(book))
+def on_close():
+    library.close()
+    root.destroy()
 
 def clear_inputs():
     title_entry.delete(0, tk.END)
@@ -107,6 +172,7 @@ def clear_inputs():
     isbn_entry.delete(0, tk.END)
     ebook_var.set(False)
     toggle_ebook_size_field()
+    copies_spinbox.set(1)
 
 # ================= UI Layout =================
 
@@ -138,9 +204,15 @@ ttk.Label(frame, text="Download Size (MB)").grid(row=4, column=0, sticky="e", pa
 size_entry = ttk.Entry(frame, state="disabled")
 size_entry.grid(row=4, column=1, pady=PAD_Y, sticky="we")
 
+# Copies
+ttk.Label(frame, text="Copies").grid(row=5, column=0, sticky="e", padx=PAD_X, pady=PAD_Y)
+copies_spinbox = ttk.Spinbox(frame, from_=1, to=9999)
+copies_spinbox.set(1)
+copies_spinbox.grid(row=5, column=1, pady=PAD_Y, sticky="we")
+
 # Buttons
 button_frame = ttk.Frame(frame)
-button_frame.grid(row=5, column=0, columnspan=2, pady=PAD_Y)
+button_frame.grid(row=6, column=0, columnspan=2, pady=PAD_Y)
 
 ttk.Button(button_frame, text="Add Book", command=add_book).grid(row=0, column=0, padx=5)
 ttk.Button(button_frame, text="Lend Book", command=lend_book).grid(row=0, column=1, padx=5)
@@ -148,6 +220,20 @@ ttk.Button(button_frame, text="Return Book", command=return_book).grid(row=0, co
 ttk.Button(button_frame, text="Remove Book", command=remove_book).grid(row=0, column=3, padx=5)
 ttk.Button(button_frame, text="Search by Author", command=view_books_by_author).grid(row=0, column=4, padx=5)
 
+# Title/author search
+ttk.Label(frame, text="Search").grid(row=7, column=0, sticky="e", padx=PAD_X, pady=PAD_Y)
+search_frame = ttk.Frame(frame)
+search_frame.grid(row=7, column=1, pady=PAD_Y, sticky="we")
+search_entry = ttk.Entry(search_frame)
+search_entry.pack(side="left", fill="x", expand=True)
+search_entry.bind("<Return>", search_books)
+ttk.Button(search_frame, text="Search", command=search_books).pack(side="left", padx=5)
+ttk.Label(search_frame, text="Sort by").pack(side="left", padx=(5, 0))
+sort_box = ttk.Combobox(search_frame, values=list(SORT_ORDERS), state="readonly", width=8)
+sort_box.set("Added")
+sort_box.bind("<<ComboboxSelected>>", update_book_list)
+sort_box.pack(side="left", padx=5)
+
 # ========== Notebook Tabs ==========
 notebook = ttk.Notebook(root)
 notebook.pack(fill="both", expand=True, padx=10, pady=10)
@@ -156,26 +242,22 @@ notebook.pack(fill="both", expand=True, padx=10, pady=10)
 available_tab = ttk.Frame(notebook)
 notebook.add(available_tab, text="Available Books")
 
-available_listbox = tk.Listbox(available_tab, height=10, font=("Segoe UI", 10))
-available_listbox.pack(side="left", fill="both", expand=True, padx=5, pady=5)
-
-available_scroll = ttk.Scrollbar(available_tab, orient="vertical", command=available_listbox.yview)
-available_scroll.pack(side="right", fill="y")
-available_listbox.config(yscrollcommand=available_scroll.set)
+available_listbox = VirtualListbox(available_tab, height=10, font=("Segoe UI", 10))
+available_listbox.pack(fill="both", expand=True, padx=5, pady=5)
 
 # Lent Books Tab
 lent_tab = ttk.Frame(notebook)
 notebook.add(lent_tab, text="Lent Books")
 
-lent_listbox = tk.Listbox(lent_tab, height=10, font=("Segoe UI", 10), fg="gray")
-lent_listbox.pack(side="left", fill="both", expand=True, padx=5, pady=5)
-
-lent_scroll = ttk.Scrollbar(lent_tab, orient="vertical", command=lent_listbox.yview)
-lent_scroll.pack(side="right", fill="y")
-lent_listbox.config(yscrollcommand=lent_scroll.set)
+lent_listbox = VirtualListbox(lent_tab, height=10, font=("Segoe UI", 10), fg="gray")
+lent_listbox.pack(fill="both", expand=True, padx=5, pady=5)
 
 # Resize config
 frame.columnconfigure(1, weight=1)
 
+root.protocol("WM_DELETE_WINDOW", on_close)
+
+showing_search = False
+library.subscribe(on_library_changed)
 update_book_list()
 root.mainloop()
\ No newline at end of file
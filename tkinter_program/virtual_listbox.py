@@ -0,0 +1,119 @@
+# virtual_listbox.py
+import tkinter as tk
+from tkinter import font as tkfont, ttk
+
+# Listbox that shows a window onto any indexable sequence of books (e.g.
+# library.available_view()). Only the rows that fit on screen are inserted
+# into the Tk listbox and the scrollbar is sized from len(books), so a
+# refresh or a scroll costs the same whatever the catalog size.
+class VirtualListbox(ttk.Frame):
+    def __init__(self, master, **listbox_options):
+        super().__init__(master)
+        self.books = []
+        self.top = 0  # index of the first row shown
+        self.row_isbns = []  # ISBN shown on each listbox row
+        self.rows_by_isbn = {}  # ISBN -> listbox rows showing it
+        self.listbox = tk.Listbox(self, **listbox_options)
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.row_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace")
+
+        self.listbox.bind("<Configure>", lambda event: self.refresh())
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(3))
+        self.listbox.bind("<Prior>", lambda event: self.scroll(-self.visible_rows()))
+        self.listbox.bind("<Next>", lambda event: self.scroll(self.visible_rows()))
+
+    def set_books(self, books):
+        self.books = books
+        self.top = 0
+        self.refresh()
+
+    def visible_rows(self):
+        return max(1, self.listbox.winfo_height() // self.row_height)
+
+    def scroll(self, rows):
+        self.top += rows
+        self.refresh()
+        return "break"
+
+    # Scrollbar command: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.books))
+        elif args[0] == "scroll":
+            rows = int(args[1])
+            self.top += rows * self.visible_rows() if args[2] == "pages" else rows
+        self.refresh()
+
+    def refresh(self):
+        total = len(self.books)
+        rows = self.visible_rows()
+        self.top = max(0, min(self.top, total - rows))
+        end = min(total, self.top + rows)
+        shown = [self.books[i] for i in range(self.top, end)]
+        self.listbox.delete(0, tk.END)
+        if shown:
+            self.listbox.insert(tk.END, *(str(book) for book in shown))
+        self.row_isbns = []
+        self.rows_by_isbn = {}
+        for row, book in enumerate(shown):
+            self._index_row(row, book)
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = len(self.books)
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + self.listbox.size()) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    # Incremental update after a Library change, for views that only move
+    # books into removed slots and append at the end (library views): rows
+    # past the new end are dropped, rows showing one of `books` are redrawn
+    # (the book moved up from the end, or new copy counts), and new rows at
+    # the end are filled in. Rows are found through rows_by_isbn, never by
+    # searching the listbox.
+    def books_changed(self, books):
+        if not getattr(self.books, "stable_positions", False):
+            return self.refresh()
+        keep = len(self.books) - self.top
+        if self.top and keep < self.visible_rows():
+            return self.refresh()  # the end of the list moved up into the window
+        if keep < self.listbox.size():
+            for row in range(keep, self.listbox.size()):
+                self._forget_row(row)
+            del self.row_isbns[keep:]
+            self.listbox.delete(keep, tk.END)
+        dirty = set()
+        for book in books:
+            dirty.update(self.rows_by_isbn.get(book.isbn, ()))
+        for row in sorted(dirty):
+            book = self.books[self.top + row]
+            self._forget_row(row)
+            self.listbox.delete(row)
+            self.listbox.insert(row, str(book))
+            self._index_row(row, book)
+        end = min(len(self.books), self.top + self.visible_rows())
+        for i in range(self.top + self.listbox.size(), end):
+            book = self.books[i]
+            self.listbox.insert(tk.END, str(book))
+            self._index_row(self.listbox.size() - 1, book)
+        self.update_scrollbar()
+
+    def _index_row(self, row, book):
+        isbn = getattr(book, "isbn", None)  # search headers are plain strings
+        if row == len(self.row_isbns):
+            self.row_isbns.append(isbn)
+        else:
+            self.row_isbns[row] = isbn
+        self.rows_by_isbn.setdefault(isbn, set()).add(row)
+
+    def _forget_row(self, row):
+        isbn = self.row_isbns[row]
+        rows = self.rows_by_isbn[isbn]
+        rows.discard(row)
+        if not rows:
+            del self.rows_by_isbn[isbn]